@@ -1,4 +1,18 @@
 from .widgets import *
+from .fontcache import FontRegistry, font_registry, get_font, preload_fonts
+from .imagecache import ImageCache, image_cache, load_image
+from .sharedcache import SharedImageCache
+from .skins import BubbleSkin
+from .canvaspool import CanvasPool, canvas_pool
+from .quality import Quality, profiles as quality_profiles
+from .memo import RenderCache, use_render_cache, reads
+from .batch import render_many, TemplateFactory
+from .encoding import encode, presets as encode_presets
+from .buffers import buffer_image
+from .streaming import StreamLayout, PNGStreamWriter
+from .animation import render_animation, save_animation
+from .warmup import warmup
+from .get_emoji import EmojiStore, EmojiSource, DirectoryEmojiSource, ZipEmojiSource, HTTPEmojiSource, get_emoji_store, set_emoji_store
 def Keyword(kwa, *args):
     def f(**kwargs):
         nonlocal args
@@ -6,4 +20,5 @@ def Keyword(kwa, *args):
             return kwargs.get(kwa, args[0])
         else:
             return kwargs[kwa]
+    f.kwargsKeys = (kwa, )
     return f
\ No newline at end of file
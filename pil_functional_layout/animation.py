@@ -0,0 +1,76 @@
+from PIL import Image
+from os import fspath, path
+try:
+    from . import memo
+except ImportError:
+    import memo
+# animated output
+# render_animation() renders a widget once per frame, with kwargs frame (the index) and
+# frameTime (seconds since the first frame) added. the frames share a RenderCache, so
+# subtrees that don't read either are rendered once and reused, only the containers
+# above changing subtrees are composited again. gif picks its frame by frameTime, content
+# callables (a ProgressBar's progress, a Text's text...) declare frame or frameTime like
+# any other kwargs they read, see memo.reads.
+# save_animation() encodes the frames as GIF, APNG or animated WebP. the encoders store
+# only the part of each frame that changed since the previous one, GIF frames are
+# quantized to one shared palette so that static parts stay identical between frames.
+
+_FORMATS = {".gif": "GIF", ".png": "PNG", ".apng": "PNG", ".webp": "WEBP"}
+
+
+def render_animation(widget, duration, fps, cache=None, **kwargs):
+    # returns the list of frames, duration in seconds
+    # cache: a memo.RenderCache, a new one by default
+    if(cache is None):
+        cache = memo.RenderCache()
+    n = max(1, int(round(duration*fps)))
+    ret = []
+    for i in range(n):
+        ret.append(cache.render(widget, **dict(kwargs, frame=i, frameTime=i/fps)))
+    return ret
+
+
+def _flatten(im, matte):
+    if(im.mode == "RGB"):
+        return im
+    im = im.convert("RGBA")
+    ret = Image.new("RGBA", im.size, tuple(matte)+(255, ))
+    ret.alpha_composite(im)
+    return ret.convert("RGB")
+
+
+def shared_palette(frames, colors=256, sample=8):
+    # a "P" image whose palette covers all frames, made from a few evenly spaced ones
+    step = max(1, len(frames)//sample)
+    picked = [i.convert("RGB") for i in frames[::step][:sample]]
+    strip = Image.new("RGB", (max(i.width for i in picked),
+                      sum(i.height for i in picked)))
+    top = 0
+    for i in picked:
+        strip.paste(i, (0, top))
+        top += i.height
+    return strip.quantize(colors, method=Image.MEDIANCUT)
+
+
+def save_animation(frames, fp, fps, format=None, loop=0, matte=(255, 255, 255), **save_kwargs):
+    # fp: a path or a binary file object, format from the extension when not given
+    # matte: background for transparent pixels in GIF, APNG and WebP keep alpha
+    if(format is None):
+        ext = path.splitext(fspath(fp))[1].lower() if not hasattr(fp, "write") else ""
+        format = _FORMATS.get(ext, "GIF")
+    format = format.upper()
+    if(format == "APNG"):
+        format = "PNG"
+    save_kwargs.update(save_all=True, duration=int(round(1000/fps)), loop=loop)
+    if(format == "GIF"):
+        frames = [_flatten(i, matte) for i in frames]
+        palette = shared_palette(frames)
+        # no dithering, it would spread changes into the static parts
+        frames = [i.quantize(palette=palette, dither=0) for i in frames]
+    elif(format == "PNG"):
+        save_kwargs.setdefault("default_image", False)
+    elif(format == "WEBP"):
+        save_kwargs.setdefault("lossless", True)
+    else:
+        raise ValueError("unsupported animation format %s" % format)
+    frames[0].save(fp, format, append_images=frames[1:], **save_kwargs)
@@ -0,0 +1,87 @@
+import asyncio
+import contextvars
+import threading
+try:
+    from . import memo
+except ImportError:
+    import memo
+# async render path
+# coroutine functions can be used as content anywhere a content callable can. the tree
+# is still rendered by the usual synchronous code, Widget.render_async() runs it in
+# passes: every coroutine function reached is called with its kwargs, stands in as a
+# 1x1 transparent image (subtrees containing one aren't memoized), and once the pass is
+# done all of them are awaited together. the next pass renders with their results.
+# contents that only turn up once others are resolved, like a coroutine returning
+# widgets with coroutine contents, take another round. the first pass that reaches
+# nothing unresolved is the result, so a tree without coroutine contents renders once.
+
+MAX_ROUNDS = 32
+_resolver = contextvars.ContextVar("pil_functional_layout_resolver", default=None)
+
+
+class Pending(Exception):
+    # raised where an unresolved coroutine content is reached, caught by _render_content
+    pass
+
+
+class _Resolver:
+    def __init__(self):
+        self.results = dict()
+        self.pending = dict()   # key -> coroutine
+        self.refs = []
+        self._lock = threading.Lock()
+
+    def resolve(self, func, kwargs):
+        key = memo.call_key(func, kwargs, self.refs)
+        with self._lock:
+            if(key in self.results):
+                return self.results[key]
+            if(key not in self.pending):
+                self.pending[key] = func(**kwargs)
+        raise Pending(func)
+
+    async def gather(self):
+        with self._lock:
+            pending, self.pending = self.pending, dict()
+        results = await asyncio.gather(*pending.values())
+        with self._lock:
+            self.results.update(zip(pending.keys(), results))
+
+
+def resolve(func, kwargs):
+    resolver = _resolver.get()
+    if(resolver is None):
+        raise Exception(
+            "content %s is a coroutine function, use render_async()" % func)
+    return resolver.resolve(func, kwargs)
+
+
+def _pass(widget, resolver, cache, kwargs):
+    token = _resolver.set(resolver)
+    try:
+        return memo.run_detached(cache, widget.render, (), kwargs)[0]
+    except Pending:
+        return None
+    except Exception:
+        # widgets may not cope with placeholders, retry once pending contents are resolved
+        if(resolver.pending):
+            return None
+        raise
+    finally:
+        _resolver.reset(token)
+
+
+async def render_async(widget, offload, kwargs):
+    loop = asyncio.get_running_loop()
+    executor = None if offload is True else offload
+    resolver = _Resolver()
+    cache = memo.active_cache()
+    for i in range(MAX_ROUNDS):
+        if(offload):
+            ret = await loop.run_in_executor(executor, _pass, widget, resolver, cache, kwargs)
+        else:
+            ret = _pass(widget, resolver, cache, kwargs)
+        if(not resolver.pending):
+            return ret
+        await resolver.gather()
+    raise Exception("coroutine contents still unresolved after %d rounds" % MAX_ROUNDS)
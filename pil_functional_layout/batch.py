@@ -0,0 +1,130 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from collections import deque
+from importlib import import_module
+from itertools import islice
+import multiprocessing
+import os
+import pickle
+try:
+    from .memo import RenderCache
+    from .encoding import encode
+except ImportError:
+    from memo import RenderCache
+    from encoding import encode
+# batch rendering on a process pool
+# the template is handed to every worker once, in the pool initializer. with the fork
+# start method it is inherited as is, lambdas and closures included. with spawn it has
+# to be pickled, templates that can't be should be passed as a TemplateFactory which
+# builds the template inside the worker instead.
+
+
+class TemplateFactory:
+    # func is a module level function returning the widget, or a "module:function" string
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def build(self):
+        func = self.func
+        if(isinstance(func, str)):
+            module, name = func.split(":")
+            func = getattr(import_module(module), name)
+        return func(*self.args, **self.kwargs)
+
+
+_worker = {}
+
+
+def _init_worker(template, cache_bytes):
+    if(isinstance(template, TemplateFactory)):
+        template = template.build()
+    _worker["template"] = template
+    _worker["cache"] = RenderCache(cache_bytes) if cache_bytes else None
+
+
+def _render_one(kwargs, format, save_kwargs):
+    template = _worker["template"]
+    cache = _worker["cache"]
+    if(cache is not None):
+        im = cache.render(template, **kwargs)
+    else:
+        im = template.render(**kwargs)
+    if(format is None):
+        return im
+    return encode(im, format, **save_kwargs)
+
+
+def _render_chunk(chunk, format, save_kwargs):
+    return [_render_one(kwargs, format, save_kwargs) for kwargs in chunk]
+
+
+def _chunks(iterable, chunksize):
+    it = iter(iterable)
+    while(True):
+        chunk = list(islice(it, chunksize))
+        if(not chunk):
+            return
+        yield chunk
+
+
+def _context(mp_context):
+    if(mp_context is None):
+        methods = multiprocessing.get_all_start_methods()
+        mp_context = "fork" if "fork" in methods else methods[0]
+    if(isinstance(mp_context, str)):
+        mp_context = multiprocessing.get_context(mp_context)
+    return mp_context
+
+
+def render_many(widget, iterable_of_kwargs, workers=None, chunksize=8, ordered=True,
+                max_in_flight=None, format=None, save_kwargs=None, cache_bytes=0, mp_context=None):
+    """
+        widget: Widget or TemplateFactory
+        iterable_of_kwargs: consumed lazily, at most max_in_flight chunks are pending
+        ordered: yield in input order, or as soon as each chunk completes
+        format: if set, workers return encoded bytes instead of images, an
+            encoding.presets name or a PIL format
+        cache_bytes: give every worker a memo.RenderCache of this budget
+        yields (index, image or bytes)
+    """
+    mp_context = _context(mp_context)
+    if(mp_context.get_start_method() != "fork" and not isinstance(widget, TemplateFactory)):
+        try:
+            pickle.dumps(widget)
+        except Exception as e:
+            raise TypeError(
+                "template can't be pickled for %s workers, pass a TemplateFactory" % mp_context.get_start_method()) from e
+    save_kwargs = save_kwargs or {}
+    workers = workers or os.cpu_count() or 1
+    if(max_in_flight is None):
+        max_in_flight = workers*2
+    with ProcessPoolExecutor(workers, mp_context=mp_context, initializer=_init_worker,
+                             initargs=(widget, cache_bytes)) as executor:
+        chunks = enumerate(_chunks(iterable_of_kwargs, chunksize))
+        pending = deque()
+        starts = dict()
+
+        def submit():
+            for idx, chunk in chunks:
+                future = executor.submit(
+                    _render_chunk, chunk, format, save_kwargs)
+                starts[future] = idx*chunksize
+                pending.append(future)
+                return True
+            return False
+
+        while(len(pending) < max_in_flight and submit()):
+            pass
+        while(pending):
+            if(ordered):
+                future = pending.popleft()
+                future.result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                future = next(iter(done))
+                pending.remove(future)
+            start = starts.pop(future)
+            submit()
+            for jdx, result in enumerate(future.result()):
+                yield start+jdx, result
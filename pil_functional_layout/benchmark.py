@@ -0,0 +1,406 @@
+from time import perf_counter
+from io import BytesIO
+import os
+import resource
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from .widgets import *
+    from . import example
+    from .memo import RenderCache
+    from .batch import render_many
+    from .canvaspool import CanvasPool
+    from .animation import render_animation
+    from .memo import reads
+    from .encoding import presets
+    from .imagecache import ImageCache
+    from .sharedcache import SharedImageCache
+    from .warmup import warmup
+    from .fontcache import font_registry
+    from .imagecache import image_cache
+except ImportError:
+    from widgets import *
+    import example
+    from memo import RenderCache
+    from batch import render_many
+    from canvaspool import CanvasPool
+    from animation import render_animation
+    from memo import reads
+    from encoding import presets
+    from imagecache import ImageCache
+    from sharedcache import SharedImageCache
+    from warmup import warmup
+    from fontcache import font_registry
+    from imagecache import image_cache
+
+
+def timeit(func, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = perf_counter()
+        func()
+        cost = perf_counter()-start
+        if(best is None or cost < best):
+            best = cost
+    return best
+
+
+def bench_line_breaking(lengths=(500, 1000, 2000, 5000, 10000), width=300, font=None, repeat=3):
+    # RichText wrapping should cost the same per character whatever the message length
+    sample = "The quick brown fox jumps over the lazy dog. "
+    print("%8s %10s %14s" % ("chars", "seconds", "us per char"))
+    ret = []
+    for n in lengths:
+        text = (sample*(n//len(sample)+1))[:n]
+        rt = RichText([text], width=width, font=font, fontSize=18)
+        cost = timeit(rt.render, repeat=repeat)
+        print("%8d %10.4f %14.2f" % (n, cost, cost/n*1e6))
+        ret.append((n, cost))
+    return ret
+
+
+def deep_card(depth=30, font=None):
+    # nested Rows and Columns on an opaque background
+    ret = Text('leaf', font=font, fontSize=14, bg=c_color_WHITE)
+    for i in range(depth):
+        container = Row if i % 2 else Column
+        ret = container([ret, colorBox(c_color_RED, 30), Text('x%d' % i, font=font, bg=c_color_WHITE)],
+                        bg=c_color_WHITE, borderWidth=4, outer_border=True)
+    return ret
+
+
+def bench_flat_layout(depths=(10, 20, 40), font=None, repeat=3):
+    # render() pastes every level into its parent, render_flat() paints into one canvas
+    print("%8s %10s %12s %6s" % ("depth", "render", "render_flat", "same"))
+    ret = []
+    for depth in depths:
+        w = deep_card(depth, font=font)
+        a = timeit(w.render, repeat=repeat)
+        b = timeit(w.render_flat, repeat=repeat)
+        same = w.render().tobytes() == w.render_flat().tobytes()
+        print("%8d %10.4f %12.4f %6s" % (depth, a, b, same))
+        ret.append((depth, a, b))
+    return ret
+
+
+def bench_compiled(n=20, font=None):
+    # tree interpretation against a compiled Plan for the example templates
+    avatar = Image.open(example.avatar_pth)
+    message = ["Hi, greets! \nIsn't my avatar cute?\n", avatar,
+               "This widget can combine text contents and image contents."]
+    transparent, with_bg = example.IM_style_message()
+    cases = [
+        ("profile_renderer", example.profile_renderer(),
+         dict(avatar=example.avatar_pth, username="TkskKurumi", intro="this is users introduction")),
+        ("IM_style_message", transparent,
+         dict(avatar=avatar, username="TkskKurumi", message=message)),
+    ]
+    print("%18s %10s %10s %14s %6s" %
+          ("template", "tree", "plan", "plan+cache", "same"))
+    ret = []
+    for name, widget, kwargs in cases:
+        kwargs["font"] = font
+        plan = widget.compile()
+        cached = widget.compile(cache=RenderCache())
+        a = timeit(lambda: [widget.render(**kwargs) for i in range(n)])/n
+        b = timeit(lambda: [plan.render(**kwargs) for i in range(n)])/n
+        c = timeit(lambda: [cached.render(**kwargs) for i in range(n)])/n
+        expected = widget.render(**kwargs).tobytes()
+        same = expected == plan.render(**kwargs).tobytes() == cached.render(**kwargs).tobytes()
+        print("%18s %10.5f %10.5f %14.5f %6s" % (name, a, b, c, same))
+        ret.append((name, a, b, c))
+    return ret
+
+
+def bench_render_many(n=64, workers=(1, 2, 4), font=None):
+    # throughput of render_many against a plain loop, in images per second
+    transparent, with_bg = example.IM_style_message()
+    kwargs = [dict(avatar=example.avatar_pth, username="user%d" % i, font=font,
+                   message=["This is message number %d, long enough to wrap over a few lines." % i]*2)
+              for i in range(n)]
+    cost = timeit(lambda: [transparent.render(**i) for i in kwargs], repeat=1)
+    print("%8s %10s %12s" % ("workers", "seconds", "images/s"))
+    print("%8s %10.4f %12.2f" % ("loop", cost, n/cost))
+    ret = [(0, cost)]
+    for w in workers:
+        cost = timeit(lambda: list(render_many(transparent, kwargs, workers=w)), repeat=1)
+        print("%8d %10.4f %12.2f" % (w, cost, n/cost))
+        ret.append((w, cost))
+    return ret
+
+
+def bench_parallel_children(n=8, workers=(2, 4), font=None, repeat=3):
+    # a Row of avatar heavy Columns, children rendered one by one and on a thread pool.
+    # resampling releases the GIL, so this gains with several cores. with one, workers
+    # can't help and the executor is skipped, see Widget.parallelMinChildren
+    avatar = Image.open(example.avatar_pth)
+
+    def card(i):
+        return Column([AvatarCircle(avatar, size=256), Text("user %d" % i, font=font, fontSize=24),
+                       SizeBox(avatar, stretchWH=(320, 320))], borderWidth=8)
+    row = Row([card(i) for i in range(n)], bg=c_color_WHITE, borderWidth=8)
+    expected = row.render().tobytes()
+    cost = timeit(row.render, repeat=repeat)
+    print("%d cpus" % (os.cpu_count() or 1))
+    print("%8s %10s %6s" % ("workers", "seconds", "same"))
+    print("%8s %10.4f %6s" % ("serial", cost, True))
+    ret = [(0, cost)]
+    for w in workers:
+        with ThreadPoolExecutor(w) as executor:
+            cost = timeit(lambda: row.render(executor=executor), repeat=repeat)
+            same = row.render(executor=executor).tobytes() == expected
+        print("%8d %10.4f %6s" % (w, cost, same))
+        ret.append((w, cost))
+    return ret
+
+
+def bench_quality(profiles=("final", "balanced", "draft"), font=None, repeat=3):
+    # a gallery of downscaled photos and a chat message under each quality profile
+    avatar = Image.open(example.avatar_pth)
+    gallery = Grid([SizeBox(avatar, cropWH=(160, 120)) for i in range(12)]
+                   + [AvatarCircle(avatar, size=96) for i in range(6)], bg=(255, 255, 255, 255))
+    transparent, with_bg = example.IM_style_message()
+    message = dict(avatar=avatar, username="TkskKurumi", font=font,
+                   message=["Hi, greets! \nIsn't my avatar cute?\n", avatar])
+    print("%10s %10s %10s" % ("quality", "gallery", "message"))
+    ret = []
+    for quality in profiles:
+        a = timeit(lambda: gallery.render(quality=quality), repeat=repeat)
+        b = timeit(lambda: transparent.render(
+            quality=quality, **message), repeat=repeat)
+        print("%10s %10.4f %10.4f" % (quality, a, b))
+        ret.append((quality, a, b))
+    return ret
+
+
+def bench_compositing(n=100, size=(96, 96), repeat=5):
+    # a Row of n images, against converting and pasting every child with itself as mask
+    avatar = Image.open(example.avatar_pth)
+    print("%8s %10s %10s %6s" % ("children", "masked", "row", "same"))
+    ret = []
+    for mode in ("RGB", "RGBA"):
+        children = [avatar.convert(mode).resize(size) for i in range(n)]
+        row = Row(children, bg=(255, 255, 255, 255))
+
+        def masked():
+            contents = [i.convert("RGBA") for i in children]
+            ret = Image.new("RGBA", (size[0]*n, size[1]), (255, 255, 255, 255))
+            for idx, i in enumerate(contents):
+                ret.paste(i, box=(idx*size[0], 0), mask=i)
+            return ret
+        a = timeit(masked, repeat=repeat)
+        b = timeit(row.render, repeat=repeat)
+        same = masked().tobytes() == row.render().tobytes()
+        print("%8s %10.4f %10.4f %6s" % (mode, a, b, same))
+        ret.append((mode, a, b))
+    return ret
+
+
+def bench_canvas_pool(sizes=((64, 20), (400, 40), (2000, 2000)), n=300, max_bytes=64 << 20):
+    # scratch canvases from Image.new against a pool, microseconds per canvas
+    pool = CanvasPool(max_bytes)
+    print("%12s %10s %10s" % ("size", "new", "pool"))
+    ret = []
+    for size in sizes:
+        def new():
+            for i in range(n):
+                Image.new("RGBA", size, (0, 0, 0, 0))
+
+        def pooled():
+            for i in range(n):
+                pool.new("RGBA", size, (0, 0, 0, 0))
+        a = timeit(new)/n*1e6
+        b = timeit(pooled)/n*1e6
+        print("%12s %10.2f %10.2f" % ("%dx%d" % size, a, b))
+        ret.append((size, a, b))
+    return ret
+
+
+def _chat_export(n, font):
+    def message(i):
+        return Row([colorBox((i % 256, 128, 128, 255), 32),
+                    Text("message %d" % i, font=font, fontSize=16)], bg=(255, 255, 255, 255), borderWidth=4)
+    return Column([message(i) for i in range(n)], bg=(240, 240, 240, 255), borderWidth=4)
+
+
+def _streaming_peak(mode, n, band_height, font, conn):
+    # run in a fresh process, peak rss growth is the mode's own
+    col = _chat_export(n, font)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = perf_counter()
+    if(mode == "banded"):
+        col.stream().save_png(BytesIO(), band_height)
+    else:
+        col.render().save(BytesIO(), "PNG")
+    cost = perf_counter()-start
+    conn.send((cost, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss-before)/1024))
+
+
+def bench_streaming(n=500, band_height=256, viewport=(0, 0, 400, 600), font=None):
+    # a tall chat export saved whole and streamed in bands, each in a spawned process for
+    # its peak memory, and a viewport of it
+    import multiprocessing
+    ctx = multiprocessing.get_context("spawn")
+    ret = []
+    print("%10s %10s %12s" % ("mode", "seconds", "peak growth"))
+    for name in ("banded", "whole"):
+        a, b = ctx.Pipe()
+        p = ctx.Process(target=_streaming_peak, args=(name, n, band_height, font, b))
+        p.start()
+        cost, peak = a.recv()
+        p.join()
+        print("%10s %10.4f %10.1fMB" % (name, cost, peak))
+        ret.append((name, cost, peak))
+    layout = _chat_export(n, font).stream()
+    cost = timeit(lambda: layout.region(viewport), repeat=3)
+    print("%10s %10.4f" % ("viewport", cost))
+    ret.append(("viewport", cost))
+    return ret
+
+
+def bench_animation(duration=2, fps=30, font=None):
+    # a status card whose progress bar follows the frame, every frame rendered in full
+    # and through render_animation, which renders the rest of the card once
+    avatar = Image.open(example.avatar_pth)
+    n = int(round(duration*fps))
+    progress = reads("frame")(lambda frame, **kwargs: frame/max(n-1, 1))
+    card = Column([Row([AvatarCircle(avatar, size=96), Text("uploading...", font=font, fontSize=24)], borderWidth=8),
+                   ProgressBar(320, progress=progress)], bg=(255, 255, 255, 255), borderWidth=8)
+    full = timeit(lambda: [card.render(frame=i, frameTime=i/fps)
+                  for i in range(n)], repeat=1)
+    animated = timeit(lambda: render_animation(
+        card, duration, fps), repeat=1)
+    print("%8s %10s %12s" % ("frames", "full", "animation"))
+    print("%8d %10.4f %12.4f" % (n, full, animated))
+    return full, animated
+
+
+def bench_encoding(n=20, font=None):
+    # render().save(PNG) against render_bytes with every preset, then encoding on the
+    # shared pool overlapping the next render
+    card = Column([Text("status: ok", font=font, fontSize=24), ProgressBar(300, progress=0.4)],
+                  bg=(255, 255, 255, 255), borderWidth=8)
+
+    def baseline():
+        bio = BytesIO()
+        card.render().save(bio, "PNG")
+        return bio.getvalue()
+    print("%14s %10s %10s" % ("format", "seconds", "bytes"))
+    cost = timeit(lambda: [baseline() for i in range(n)])
+    print("%14s %10.4f %10d" % ("save(PNG)", cost, len(baseline())))
+    ret = [("save(PNG)", cost)]
+    for name in presets:
+        cost = timeit(lambda: [card.render_bytes(name) for i in range(n)])
+        print("%14s %10.4f %10d" % (name, cost, len(card.render_bytes(name))))
+        ret.append((name, cost))
+    cost = timeit(lambda: [i.result() for i in [card.render_bytes(
+        "png", encode_executor=True) for i in range(n)]])
+    print("%14s %10.4f" % ("png, pooled", cost))
+    ret.append(("png, pooled", cost))
+    return ret
+
+
+def bench_render_into(n=20, font=None):
+    # a 1280x720 frame, render() plus a copy into the frame against render_into
+    try:
+        import numpy as np
+    except ImportError:
+        print("numpy is not installed")
+        return None
+    avatar = Image.open(example.avatar_pth)
+    card = Column([Row([AvatarCircle(avatar, size=256), Text("now playing", font=font, fontSize=48)], borderWidth=16),
+                   ProgressBar(1200, progress=0.4)], bg=(255, 255, 255, 255), borderWidth=16)
+    w, h = card.render().size
+    frame = np.zeros((max(h, 720), max(w, 1280), 4), np.uint8)
+
+    def copied():
+        frame[:h, :w] = np.asarray(card.render())
+    a = timeit(lambda: [copied() for i in range(n)])
+    b = timeit(lambda: [card.render_into(frame[:h, :w]) for i in range(n)])
+    print("%12s %12s" % ("copied", "render_into"))
+    print("%12.4f %12.4f" % (a, b))
+    return a, b
+
+
+def _load_all(pths, shared):
+    cache = ImageCache(shared=shared)
+    start = perf_counter()
+    for i in pths:
+        cache.load(i)
+    return perf_counter()-start
+
+
+def bench_shared_image_cache(n=8, size=(1024, 1024), workers=4):
+    # every worker loads the same n PNGs, decoding privately against the shared cache,
+    # then again with the shared cache already filled
+    import multiprocessing
+    import tempfile
+    avatar = Image.open(example.avatar_pth).convert("RGBA").resize(size)
+    with tempfile.TemporaryDirectory() as tmp:
+        pths = []
+        for i in range(n):
+            pth = os.path.join(tmp, "%d.png" % i)
+            avatar.rotate(i*10).save(pth)
+            pths.append(pth)
+        shared = SharedImageCache(os.path.join(tmp, "shared"))
+        ctx = multiprocessing.get_context("fork")
+        ret = []
+        for name, backend in (("private", None), ("shared", shared), ("warm", shared)):
+            with ctx.Pool(workers) as pool:
+                start = perf_counter()
+                pool.starmap(_load_all, [(pths, backend)]*workers)
+                cost = perf_counter()-start
+            decoded = n*workers if backend is None else shared.stats()["entries"]
+            print("%8s %10.4f %8d copies %6.1fMB pixels" % (
+                name, cost, decoded, decoded*size[0]*size[1]*4/(1 << 20)))
+            ret.append((name, cost))
+        shared.clear()
+    return ret
+
+
+def _first_render(card, conn):
+    start = perf_counter()
+    card.render(name="worker")
+    conn.send(perf_counter()-start)
+
+
+def bench_warmup(font=None):
+    # first render in a forked worker, with the caches cleared against after warmup()
+    import multiprocessing
+    ctx = multiprocessing.get_context("fork")
+    avatar = example.avatar_pth
+    card = Column([Row([AvatarCircle(avatar, size=128), Text(reads("name")(lambda name, **kwargs: name), font=font, fontSize=32)], borderWidth=8),
+                   ProgressBar(600, progress=0.5)], bg=(255, 255, 255, 255), borderWidth=8)
+
+    def first():
+        a, b = ctx.Pipe()
+        p = ctx.Process(target=_first_render, args=(card, b))
+        p.start()
+        ret = a.recv()
+        p.join()
+        return ret
+    font_registry.clear()
+    image_cache.clear()
+    cold = first()
+    report = warmup([card], [font], [{"name": "sample"}], font_sizes=(32, ))
+    warm = first()
+    print("%12s %12s %10s %10s" % ("cold first", "warm first", "warmup", "rss MB"))
+    print("%12.4f %12.4f %10.4f %10.1f" % (cold, warm, report["seconds"],
+                                            report["rss_growth"]/(1 << 20)))
+    return cold, warm, report
+
+
+if(__name__ == '__main__'):
+    bench_line_breaking()
+    bench_flat_layout()
+    bench_compiled()
+    bench_render_many()
+    bench_parallel_children()
+    bench_quality()
+    bench_compositing()
+    bench_canvas_pool()
+    bench_streaming()
+    bench_animation()
+    bench_encoding()
+    bench_render_into()
+    bench_shared_image_cache()
+    bench_warmup()
@@ -0,0 +1,64 @@
+from PIL import Image
+import ctypes
+# raw output into caller owned memory
+# buffer_image() maps an RGBA image onto a writable buffer, drawing on it writes the
+# buffer in place. Widget.render_into() paints the measured layout straight into it, so
+# the pixels land in the caller's memory without a final copy.
+# targets:
+#     an array with __array_interface__ (numpy), uint8 of shape (height, width, 4). rows
+#         may be padded, e.g. a view into a larger frame, pixels must be contiguous
+#     anything else exporting a writable buffer: bytearray, memoryview, mmap,
+#         multiprocessing.shared_memory.SharedMemory (its .buf). size is required, stride
+#         (bytes per row) defaults to width*4, offset to 0
+# the image is only valid while the target is alive and unchanged in size.
+
+
+def _array_target(target):
+    desc = target.__array_interface__
+    shape = desc["shape"]
+    if(desc["typestr"] != "|u1" or len(shape) != 3 or shape[2] != 4):
+        raise ValueError("expected a uint8 array of shape (height, width, 4), got %s %s" % (
+            desc["typestr"], shape))
+    address, readonly = desc["data"]
+    if(readonly):
+        raise ValueError("the array is read only")
+    height, width = shape[:2]
+    strides = desc.get("strides")
+    if(strides is None):
+        stride = width*4
+    elif(strides[1:] == (4, 1) and strides[0] > 0):
+        stride = strides[0]
+    else:
+        raise ValueError("array pixels must be contiguous, strides %s" % (strides, ))
+    return address, (width, height), stride
+
+
+def _buffer_target(target, size, stride, offset):
+    buf = memoryview(getattr(target, "buf", target)).cast("B")
+    if(buf.readonly):
+        raise ValueError("the buffer is read only")
+    if(size is None):
+        raise ValueError("size is required for raw buffers")
+    width, height = size
+    stride = stride or width*4
+    if(stride < width*4):
+        raise ValueError("stride %d is less than a row, %d" % (stride, width*4))
+    end = offset+stride*(height-1)+width*4
+    if(end > len(buf)):
+        raise ValueError("%d bytes needed, the buffer has %d" % (end, len(buf)))
+    address = ctypes.addressof(ctypes.c_char.from_buffer(buf))
+    return address+offset, (width, height), stride
+
+
+def buffer_image(target, size=None, stride=None, offset=0):
+    if(hasattr(target, "__array_interface__")):
+        address, size, stride = _array_target(target)
+    else:
+        address, size, stride = _buffer_target(target, size, stride, offset)
+    # addressed through ctypes: PIL wants stride*height bytes, the padding after the
+    # last row may not exist but is never touched
+    buf = (ctypes.c_char*(stride*size[1])).from_address(address)
+    ret = Image.frombuffer("RGBA", size, buf, "raw", "RGBA", stride, 1)
+    ret.readonly = 0    # draw into the buffer instead of copying on write
+    ret._target = target    # keep it alive with the image
+    return ret
@@ -0,0 +1,102 @@
+from PIL import Image
+from collections import defaultdict, deque
+import threading
+import weakref
+# pool of scratch canvas buffers
+# for callers drawing canvases only to paste them somewhere right after: with the pool
+# enabled those are mapped onto reused buffers instead of newly allocated ones. buffers
+# are kept per (mode, size bucket), the bucket is the byte size rounded up to a power of
+# two, so one buffer backs any canvas of its mode that fits.
+# widgets don't use it: measured, a pooled canvas costs more than Image.new() when small
+# and the same when large, where filling the pixels dominates. see bench_canvas_pool().
+# ownership: a buffer goes back to the pool when the canvas mapped on it is garbage, never
+# while anything still holds the canvas, so a canvas that outlives the render just keeps
+# its buffer. only scratch canvases are taken from the pool, rendered results aren't.
+# disabled while max_bytes is 0, then new() is Image.new()
+
+_BYTES = {"L": 1, "P": 1, "RGBA": 4, "RGBX": 4, "CMYK": 4}
+_MIN_BUCKET = 4096
+
+
+def _bucket(nbytes):
+    ret = _MIN_BUCKET
+    while(ret < nbytes):
+        ret <<= 1
+    return ret
+
+
+class _Lent(weakref.ref):
+    # reference to a lent canvas, carrying its buffer
+    __slots__ = ("key", "buf")
+
+
+class CanvasPool:
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes   # bytes of idle buffers kept
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._free = defaultdict(list)  # (mode, bucket) -> buffers
+        self._lent = dict()             # id(ref) -> _Lent of canvases alive
+        # the references of collected canvases. appended to without the lock, collection
+        # can run while this thread holds it, and taken back into the pool by _drain()
+        self._returned = deque()
+        self._lock = threading.Lock()
+
+    def new(self, mode, size, color=0):
+        # like Image.new, for canvases that are dropped once pasted
+        if(not self.max_bytes or mode not in _BYTES):
+            return Image.new(mode, size, color)
+        w, h = size
+        key = (mode, _bucket(max(w*h*_BYTES[mode], 1)))
+        with self._lock:
+            self._drain()
+            free = self._free[key]
+            if(free):
+                buf = free.pop()
+                self.bytes -= key[1]
+                self.hits += 1
+            else:
+                buf = None
+                self.misses += 1
+        if(buf is None):
+            buf = bytearray(key[1])
+        ret = Image.frombuffer(mode, size, buf, "raw", mode, 0, 1)
+        ret.readonly = 0    # draw into buf instead of copying on write
+        ret.paste(color, (0, 0, w, h))
+        ref = _Lent(ret, self._returned.append)
+        ref.key = key
+        ref.buf = buf
+        with self._lock:
+            self._lent[id(ref)] = ref
+        return ret
+
+    def _drain(self):
+        # called locked
+        while(self._returned):
+            ref = self._returned.popleft()
+            if(self._lent.pop(id(ref), None) is None):
+                continue
+            if(self.bytes+ref.key[1] <= self.max_bytes):
+                self._free[ref.key].append(ref.buf)
+                self.bytes += ref.key[1]
+
+    def stats(self):
+        with self._lock:
+            self._drain()
+            looked = self.hits+self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits/looked if looked else 0.0,
+                    "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "lent": len(self._lent)}
+
+    def clear(self):
+        with self._lock:
+            self._drain()
+            self._free.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+canvas_pool = CanvasPool()
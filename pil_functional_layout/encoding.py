@@ -0,0 +1,110 @@
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import combinations
+import os
+import threading
+# encoded output
+# encode(im, format) saves to bytes. a preset name picks its save options, anything else
+# is a PIL format name saved with the given save kwargs only. save kwargs override the
+# preset's, besides PIL's own these are understood:
+#     quantize: "auto" stores PNG and GIF as "P" when the image has at most 256 colors,
+#         which is lossless. True always quantizes to 256 colors, False never does.
+#     background: color transparent pixels are flattened onto. JPEG and BMP, which
+#         have no alpha, are flattened onto white when it's not given.
+# PIL's encoders release the GIL, so encoding on a thread pool overlaps with rendering
+# the next image, see Widget.render_bytes(encode_executor=...)
+
+presets = {
+    "png": dict(format="PNG", compress_level=6, quantize="auto"),
+    "png-fast": dict(format="PNG", compress_level=1, quantize="auto"),
+    "png-small": dict(format="PNG", compress_level=9, quantize=True),
+    "webp": dict(format="WEBP", quality=80, method=4),
+    "webp-fast": dict(format="WEBP", quality=80, method=0),
+    "webp-lossless": dict(format="WEBP", lossless=True, quality=80, method=4),
+    "jpeg": dict(format="JPEG", quality=85, background=(255, 255, 255)),
+}
+_NO_ALPHA = ("JPEG", "JPG", "BMP")
+_PALETTED = ("PNG", "GIF")
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def to_palette(im):
+    # the same pixels as a "P" image if im has at most 256 colors, else None
+    colors = im.getcolors(256)
+    if(colors is None):
+        return None
+    colors = [c if isinstance(c, tuple) else (c, ) for n, c in colors]
+    bands = im.split()
+    if(len(bands) < 3):
+        return None
+    # usually one band already tells all the colors apart, it's looked up in a table
+    for idx, band in enumerate(bands):
+        values = [c[idx] for c in colors]
+        if(len(set(values)) == len(values)):
+            lut = [0]*256
+            for jdx, v in enumerate(values):
+                lut[v] = jdx
+            return _with_palette(band.point(lut), colors, im.mode)
+    # else three that do, quantized as RGB
+    for pick in combinations(range(len(bands)), 3):
+        keys = [tuple(c[i] for i in pick) for c in colors]
+        if(len(set(keys)) == len(keys)):
+            break
+    else:
+        return None
+    full = dict(zip(keys, colors))
+    ret = Image.merge("RGB", [bands[i] for i in pick]).quantize(
+        len(colors), method=Image.MEDIANCUT, dither=0)
+    palette = ret.getpalette()[:len(colors)*3]
+    entries = [full.get(tuple(palette[i:i+3])) for i in range(0, len(palette), 3)]
+    if(None in entries):
+        return None
+    return _with_palette(ret, entries, im.mode)
+
+
+def _with_palette(im, colors, mode):
+    # im: "L" or "P" indices into colors
+    im.putpalette([v for c in colors for v in c[:3]])
+    if(mode == "RGBA"):
+        im.info["transparency"] = bytes(c[3] for c in colors)
+    return im
+
+
+def _flatten(im, background):
+    ret = Image.new("RGBA", im.size, tuple(background)[:3]+(255, ))
+    ret.alpha_composite(im.convert("RGBA"))
+    return ret.convert("RGB")
+
+
+def encode(im, format="png", **save_kwargs):
+    options = dict(presets.get(format, {"format": format}))
+    options.update(save_kwargs)
+    format = options.pop("format").upper()
+    quantize = options.pop("quantize", False)
+    background = options.pop("background", None)
+    if(background is None and format in _NO_ALPHA and im.mode not in ("RGB", "L")):
+        background = (255, 255, 255)
+    if(background is not None and im.mode not in ("RGB", "L")):
+        im = _flatten(im, background)
+    if(quantize and format in _PALETTED and im.mode != "P"):
+        quantized = to_palette(im)
+        if(quantized is None and quantize is True):
+            method = Image.FASTOCTREE if im.mode == "RGBA" else Image.MEDIANCUT
+            quantized = im.quantize(256, method=method)
+        if(quantized is not None):
+            im = quantized
+    bio = BytesIO()
+    im.save(bio, format, **options)
+    return bio.getvalue()
+
+
+def encode_pool():
+    # shared thread pool for encoding, created on first use
+    global _pool
+    with _pool_lock:
+        if(_pool is None):
+            _pool = ThreadPoolExecutor(os.cpu_count() or 1,
+                                       thread_name_prefix="pil_functional_layout_encode")
+        return _pool
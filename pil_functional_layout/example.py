@@ -1,18 +1,22 @@
 try:
     from .widgets import *
+    from .memo import reads
 except Exception:
     from widgets import *
+    from memo import reads
 from os import path
 result_pth=path.join(path.dirname(__file__),'samples','results')
 project_pth=path.dirname(__file__)
 avatar_pth=path.join(project_pth,'samples','avatar.jpg')
 def profile_renderer():
+    @reads("avatar")
     def func_avatar(**kwargs):
-        avt=kwargs.get("avatar")
-        avt=Image.open(avt)
-        return avt
+        # a path, AvatarCircle decodes it at a reduced scale
+        return kwargs.get("avatar")
+    @reads("username")
     def func_name(**kwargs):
         return kwargs.get("username")
+    @reads("intro")
     def func_introduction(**kwargs):
         return kwargs.get("intro")
     
@@ -24,23 +28,17 @@ def profile_renderer():
     ret=Column([row1,row2],width=300)
     return ret
 def IM_style_message():
+    @reads("avatar")
     def func_avatar(**kwargs):
-        avt=kwargs.get("avatar")
-        if(isinstance(avt,Image.Image)):
-            return avt
-        else:
-            return Image.open(avt)
-    def extract_kwa(key):
-        def inner(key=key,**kwargs):
-            return kwargs.get(key)
-        return inner
+        # an Image or a path
+        return kwargs.get("avatar")
     w_avt=AvatarCircle(func_avatar,size=100)
-    uname=Text(extract_kwa("username"),fontSize=24)
-    message=RichText(extract_kwa("message"),alignX=0,alignY=1,fontSize=18,width=300,autoSplit=True,dont_split=True)
+    uname=Text(fExtractKwa("username"),fontSize=24)
+    message=RichText(fExtractKwa("message"),alignX=0,alignY=1,fontSize=18,width=300,autoSplit=True,dontSplit=True)
     bub=bubble.default(message,border_size=30)
     col=Column([uname,bub],alignX=0.1)
     transparent=Row([w_avt,col],alignY=0)
-    with_bg=compositeBG(transparent,extract_kwa("BG"))
+    with_bg=CompositeBG(transparent,fExtractKwa("BG"))
     return transparent,with_bg
 def im_message_example():
     transparent,with_bg=IM_style_message()
@@ -99,7 +97,7 @@ def plot_bar_chart(items,title,height=512,name_renderer=None,theme_color=c_color
     ll=theme_color.alterHSV(theme_color.H-20)
     ru=theme_color.alterHSV(theme_color.H+20)
     bar_fill=gradientBox(width=height,ll=ll,ru=ru).render()
-    bar_renderer=progressBar(width=height,borderWidth=0,progress=lambda **kwargs:kwargs.get('progress'),fill=bar_fill)
+    bar_renderer=ProgressBar(width=height,borderWidth=0,progress=lambda **kwargs:kwargs.get('progress'),fill=bar_fill)
     name_w=0
     name_h=0
     _items=[]
@@ -134,7 +132,7 @@ def plot_bar_chart_horizontal(items,title,size=512,name_renderer=None,theme_colo
     ll=theme_color.alterHSV(theme_color.H-20)
     ru=theme_color.alterHSV(theme_color.H+20)
     bar_fill=gradientBox(width=size,ll=ll,ru=ru).render()
-    bar_renderer=progressBar(width=size,borderWidth=0,progress=lambda **kwargs:kwargs.get('progress'),fill=bar_fill)
+    bar_renderer=ProgressBar(width=size,borderWidth=0,progress=lambda **kwargs:kwargs.get('progress'),fill=bar_fill)
     name_w=0
     name_h=0
     _items=[]
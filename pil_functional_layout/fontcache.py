@@ -0,0 +1,85 @@
+from PIL import ImageFont
+from collections import OrderedDict
+from io import BytesIO
+from os import fspath
+import threading
+try:
+    from . import mylocale
+except ImportError:
+    import mylocale
+
+
+class FontRegistry:
+    # process-wide cache of parsed FreeTypeFont objects
+    # keyed by (font path or bytes, size, index, layout engine), evicts least recently used
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, font, size, index, layout_engine):
+        if(isinstance(font, (bytes, bytearray))):
+            font = bytes(font)
+        else:
+            font = fspath(font)
+        return (font, size, index, layout_engine)
+
+    def get(self, font=None, size=12, index=0, layout_engine=None):
+        font = _font_or_default(font)
+        key = self._key(font, size, index, layout_engine)
+        with self._lock:
+            fnt = self._fonts.get(key)
+            if(fnt is not None):
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return fnt
+            self.misses += 1
+        # parse outside the lock, several MB fonts take a while
+        src = BytesIO(key[0]) if isinstance(key[0], bytes) else key[0]
+        fnt = ImageFont.truetype(src, size, index=index,
+                                 layout_engine=layout_engine)
+        with self._lock:
+            fnt = self._fonts.setdefault(key, fnt)
+            self._fonts.move_to_end(key)
+            while(len(self._fonts) > self.maxsize):
+                self._fonts.popitem(last=False)
+        return fnt
+
+    def preload(self, fonts=None, sizes=(12, ), index=0, layout_engine=None):
+        # load fonts ahead of time, e.g. before a worker starts serving
+        if(fonts is None or isinstance(fonts, (str, bytes, bytearray))):
+            fonts = [fonts]
+        for font in fonts:
+            for size in sizes:
+                self.get(font, size, index=index, layout_engine=layout_engine)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._fonts), "maxsize": self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._fonts.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def _font_or_default(font):
+    if(font is None):
+        return mylocale.get_default_font()
+    return font
+
+
+font_registry = FontRegistry()
+
+
+def get_font(font=None, size=12, index=0, layout_engine=None):
+    return font_registry.get(font, size, index=index, layout_engine=layout_engine)
+
+
+def preload_fonts(fonts=None, sizes=(12, ), index=0, layout_engine=None):
+    font_registry.preload(fonts, sizes, index=index,
+                          layout_engine=layout_engine)
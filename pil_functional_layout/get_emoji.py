@@ -1,28 +1,274 @@
-import requests
 from PIL import Image
+from abc import ABC, abstractmethod
 from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait, TimeoutError as FutureTimeout
+from os import path
+import os
+import threading
+import zipfile
 import regex
-def get_image(url):
-    r = requests.get(url)
-    content = r.content
-    print(r.status_code)
-    bio = BytesIO()
-    bio.write(content)
-    bio.seek(0)
-    return Image.open(bio)
+try:
+    from . import resize
+    from .quality import profiles
+except ImportError:
+    import resize
+    from quality import profiles
+
+
 class EmojiFail(Exception):
     pass
+
+
+class EmojiMissing(EmojiFail):
+    # no source has the code, asking again won't change that
+    pass
+
+
 pattern = r"\p{Emoji_Presentation}"
 _re = regex.compile(pattern)
-def get_emoji(code = "1F975"):
-    try:
-        url = "https://openmoji.org/php/download_asset.php?type=emoji&emoji_hexcode=%s&emoji_variant=color"%(code.upper(),)
-        im = get_image(url)
-    except Exception as e:
-        raise EmojiFail("Cannot get for %s"%code)
-    return im
-if(__name__=="__main__"):
-    im = get_emoji("1f123")
-    pth = "/home/TkskKurumi/tmp/tmp.png"
+
+
+def emoji_code(char):
+    return hex(ord(char)).upper()[2:]
+
+
+class EmojiSource(ABC):
+    # returns encoded image bytes for an upper-case hex code, or None if it doesn't have it
+    local = True
+
+    @abstractmethod
+    def get_bytes(self, code):
+        pass
+
+
+class DirectoryEmojiSource(EmojiSource):
+    # a directory of <CODE>.png files, e.g. an extracted openmoji pack
+    def __init__(self, pth, ext=".png"):
+        self.pth = pth
+        self.ext = ext
+
+    def get_bytes(self, code):
+        for name in [code.upper(), code.lower()]:
+            p = path.join(self.pth, name+self.ext)
+            if(path.exists(p)):
+                with open(p, "rb") as f:
+                    return f.read()
+        return None
+
+
+class ZipEmojiSource(EmojiSource):
+    # a zip of <CODE>.png files, in any sub directory
+    def __init__(self, pth, ext=".png"):
+        self.pth = pth
+        self.ext = ext
+        self._zip = zipfile.ZipFile(pth)
+        self._lock = threading.Lock()
+        self.index = dict()
+        for name in self._zip.namelist():
+            base = path.basename(name)
+            if(base.lower().endswith(ext)):
+                self.index[base[:-len(ext)].upper()] = name
+
+    def get_bytes(self, code):
+        name = self.index.get(code.upper())
+        if(name is None):
+            return None
+        with self._lock:
+            return self._zip.read(name)
+
+
+class HTTPEmojiSource(EmojiSource):
+    # network fetch, only used when explicitly added to a store
+    local = False
+    openmoji = "https://openmoji.org/php/download_asset.php?type=emoji&emoji_hexcode=%s&emoji_variant=color"
+
+    def __init__(self, url=None, timeout=10):
+        self.url = url or self.openmoji
+        self.timeout = timeout
+
+    def get_bytes(self, code):
+        import requests
+        r = requests.get(self.url % (code.upper(), ), timeout=self.timeout)
+        if(r.status_code == 404):
+            return None
+        r.raise_for_status()
+        return r.content
+
+
+def _key(code, size, quality):
+    if(size is None):
+        return (code, None)
+    return (code, size, quality.resample, quality.reducing_gap)
+
+
+class EmojiStore:
+    # looks up emoji images from sources in order,
+    # keeps decoded RGBA images scaled to the requested height in an LRU, per quality
+    # profile they were scaled with,
+    # and writes whatever was fetched from non-local sources into cache_dir.
+    def __init__(self, sources=(), cache_dir=None, maxsize=1024, max_workers=8, prefetch_timeout=None):
+        self.sources = list(sources)
+        self.cache_dir = cache_dir
+        self.maxsize = maxsize
+        self.max_workers = max_workers
+        self.prefetch_timeout = prefetch_timeout
+        self._images = OrderedDict()
+        self._missing = set()
+        self._pending = dict()      # code -> Future of the fetch running for it
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        if(cache_dir is not None):
+            os.makedirs(cache_dir, exist_ok=True)
+            self.sources.insert(0, DirectoryEmojiSource(cache_dir))
+
+    def _fetch(self, code):
+        for src in self.sources:
+            data = src.get_bytes(code)
+            if(data is None):
+                continue
+            if(self.cache_dir is not None and not src.local):
+                tmp = path.join(self.cache_dir, "%s.png.%d" %
+                                (code, threading.get_ident()))
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path.join(self.cache_dir, code+".png"))
+            return data
+        return None
+
+    def _load(self, code, size, quality, future):
+        # fetches code for the threads waiting on future, then decodes it at size
+        try:
+            data = self._fetch(code)
+        except Exception as e:
+            future.set_exception(e)
+            with self._lock:
+                self._pending.pop(code, None)
+            raise EmojiFail("Cannot get for %s" % code) from e
+        if(data is None):
+            with self._lock:
+                self._missing.add(code)
+        future.set_result(data)
+        try:
+            return self._decode(code, size, quality, data)
+        finally:
+            with self._lock:
+                self._pending.pop(code, None)
+
+    def _decode(self, code, size, quality, data):
+        if(data is None):
+            raise EmojiMissing("No source has %s" % code)
+        im = Image.open(BytesIO(data)).convert("RGBA")
+        if(size is not None):
+            im = resize.stretchHeight(im, size, **quality.resize_args())
+        key = _key(code, size, quality)
+        with self._lock:
+            im = self._images.setdefault(key, im)
+            self._images.move_to_end(key)
+            while(len(self._images) > self.maxsize):
+                self._images.popitem(last=False)
+        return im
+
+    def _claim(self, code):
+        # called locked, the fetch of code already running or a new one to run
+        future = self._pending.get(code)
+        if(future is not None):
+            return future, False
+        future = self._pending[code] = Future()
+        return future, True
+
+    def get(self, code, size=None, timeout=None, quality=None):
+        # a code being fetched by another thread, e.g. by prefetch(), is waited on at
+        # most timeout seconds, then EmojiFail is raised
+        # quality: the quality.Quality scaling to size, "final" by default
+        code = code.upper()
+        quality = quality or profiles["final"]
+        key = _key(code, size, quality)
+        with self._lock:
+            im = self._images.get(key)
+            if(im is not None):
+                self._images.move_to_end(key)
+                return im
+            if(code in self._missing):
+                raise EmojiMissing("No source has %s" % code)
+            future, owner = self._claim(code)
+        if(owner):
+            return self._load(code, size, quality, future)
+        try:
+            data = future.result(timeout)
+        except FutureTimeout as e:
+            raise EmojiFail("%s is still being fetched" % code) from e
+        except Exception as e:
+            raise EmojiFail("Cannot get for %s" % code) from e
+        return self._decode(code, size, quality, data)
+
+    def _pool(self):
+        # the store's fetch threads, created on first use. a forked child doesn't have
+        # its parent's threads, it gets its own pool
+        with self._lock:
+            if(self._executor is None or self._executor_pid != os.getpid()):
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="pil_functional_layout_emoji")
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def prefetch(self, codes, size=None, timeout=None, quality=None):
+        # fetch and decode every code that isn't cached yet concurrently,
+        # waits at most timeout seconds, failures are left for get() to report.
+        # fetches still running by then go on in the background, get() doesn't start
+        # them again
+        if(timeout is None):
+            timeout = self.prefetch_timeout
+        quality = quality or profiles["final"]
+        owned = dict()
+        waiting = []
+        with self._lock:
+            for code in set(i.upper() for i in codes):
+                if(_key(code, size, quality) in self._images or code in self._missing):
+                    continue
+                future, owner = self._claim(code)
+                if(owner):
+                    owned[code] = future
+                waiting.append(future)
+        if(timeout is None and (len(owned) <= 1 or self.max_workers <= 1)):
+            # nothing to wait for in parallel, and no deadline to keep
+            for code, future in owned.items():
+                try:
+                    self._load(code, size, quality, future)
+                except EmojiFail:
+                    pass
+        elif(owned):
+            executor = self._pool()
+            for code, future in owned.items():
+                executor.submit(self._load, code, size, quality, future)
+        wait(waiting, timeout=timeout)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._missing.clear()
+
+
+_store = EmojiStore()
+
+
+def get_emoji_store():
+    return _store
+
+
+def set_emoji_store(store):
+    global _store
+    _store = store
+
+
+def get_emoji(code="1F975", size=None):
+    return _store.get(code, size)
+
+
+if(__name__ == "__main__"):
+    store = EmojiStore([HTTPEmojiSource()])
+    im = store.get("1f123")
+    pth = "/tmp/tmp.png"
     im.save(pth)
-    print(pth)
\ No newline at end of file
+    print(pth)
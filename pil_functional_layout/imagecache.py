@@ -0,0 +1,142 @@
+from PIL import Image
+from collections import OrderedDict
+from hashlib import blake2b
+from io import BytesIO
+from os import fspath, stat, path
+import threading
+
+
+class ImageCache:
+    # process-wide cache of decoded source images, stored converted to RGBA
+    # files are keyed by (path, mtime, size) so edited files are decoded again, encoded
+    # bytes by their hash. evicts least recently used once the pixel bytes exceed max_bytes
+    # returned images are shared, draw on a copy
+    #
+    # with a size hint, the minimum (width, height) the caller will resample to, sources
+    # are decoded at 1/2, 1/4 or 1/8 scale when that's still at least the hint: JPEGs
+    # through draft() which scales while decoding, other formats through reduce().
+    # each scale is a separate entry.
+    #
+    # shared: a sharedcache.SharedImageCache, decoded images are looked up there before
+    # decoding and put there after, so worker processes decode each source once and map
+    # the same pixels. the local entries are then views of the shared ones.
+    def __init__(self, max_bytes=256 << 20, shared=None):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()    # (key, scale) -> (image, nbytes)
+        self._paths = dict()            # path -> its current key
+        self._dims = OrderedDict()      # key -> full size, so hints don't reread headers
+        self._lock = threading.Lock()
+
+    def _key(self, src):
+        if(isinstance(src, (bytes, bytearray, memoryview))):
+            return ("bytes", blake2b(src, digest_size=16).digest()), None
+        pth = path.abspath(fspath(src))
+        st = stat(pth)
+        return ("file", pth, st.st_mtime_ns, st.st_size), pth
+
+    def _open(self, src):
+        if(isinstance(src, (bytes, bytearray, memoryview))):
+            src = BytesIO(src)
+        return Image.open(src)
+
+    def _decode(self, src, scale):
+        with self._open(src) as im:
+            if(scale > 1 and im.format == "JPEG"):
+                im.draft(im.mode, (im.width//scale, im.height//scale))
+                return im.convert("RGBA")
+            # converted first, reduce() doesn't take every mode, "P" for one
+            im = im.convert("RGBA")
+            if(scale > 1):
+                return im.reduce(scale)
+            return im
+
+    def _scale(self, src, key, size):
+        with self._lock:
+            dims = self._dims.get(key)
+        if(dims is None):
+            with self._open(src) as im:
+                dims = im.size
+            with self._lock:
+                self._dims[key] = dims
+                while(len(self._dims) > 4096):
+                    self._dims.popitem(last=False)
+        w, h = dims
+        width, height = size
+        fits = min(w//width if width else w, h//height if height else h)
+        scale = 1
+        while(scale < 8 and scale*2 <= fits):
+            scale *= 2
+        return scale
+
+    def load(self, src, size=None):
+        key, pth = self._key(src)
+        scale = 1
+        if(size is not None and any(size)):
+            scale = self._scale(src, key, size)
+        base = key
+        key = (base, scale)
+        with self._lock:
+            entry = self._images.get(key)
+            if(entry is not None):
+                self._images.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        shared = self.shared
+        im = shared.get(key) if shared is not None else None
+        if(im is None):
+            im = self._decode(src, scale)
+            if(shared is not None):
+                im = shared.put(key, im)
+        nbytes = im.width*im.height*4
+        with self._lock:
+            if(pth is not None):
+                old = self._paths.get(pth)
+                if(old is not None and old != base):
+                    for i in [i for i in self._images if i[0] == old]:
+                        self._discard(i)
+                    self._dims.pop(old, None)
+                self._paths[pth] = base
+            if(nbytes > self.max_bytes):
+                return im
+            entry = self._images.get(key)
+            if(entry is not None):
+                return entry[0]
+            self._images[key] = (im, nbytes)
+            self.bytes += nbytes
+            while(self.bytes > self.max_bytes):
+                self._discard(next(iter(self._images)))
+        return im
+
+    def _discard(self, key):
+        entry = self._images.pop(key, None)
+        if(entry is not None):
+            self.bytes -= entry[1]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self.bytes,
+                    "max_bytes": self.max_bytes, "entries": len(self._images)}
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._paths.clear()
+            self._dims.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+image_cache = ImageCache()
+
+
+def load_image(src, size=None):
+    # src: file path or encoded image bytes, returns a shared RGBA image
+    # size: (width, height) it will be resampled to at least, either can be None,
+    #     allows decoding at a reduced scale
+    return image_cache.load(src, size)
@@ -0,0 +1,116 @@
+from PIL import Image
+# measure/arrange layout
+# Widget.measure(**kwargs) returns a tree of nodes which knows every widget's size and
+# the offset of each child, leaves hold their rasterized image.
+# paint() then draws the tree into a single canvas.
+#
+# containers composite a child with paste(child, mask=child), which also blends the
+# alpha channel, so drawing a container straight into its parent is only the same as
+# pasting its own bitmap when that bitmap comes out fully opaque.
+# other containers still get a scratch canvas of their own size while painting.
+
+
+def _binary_alpha(im):
+    # every pixel is either fully transparent or fully opaque
+    if(im.mode != "RGBA"):
+        return True
+    hist = im.getchannel("A").histogram()
+    return sum(hist[1:255]) == 0
+
+
+class ImageNode:
+    def __init__(self, image):
+        self.image = image
+        self.size = image.size
+        self._binary = None
+
+    def binary_alpha(self):
+        if(self._binary is None):
+            self._binary = _binary_alpha(self.image)
+        return self._binary
+
+    def opaque(self):
+        if(self.image.mode != "RGBA" or getattr(self.image, "_opaque", False)):
+            return True
+        return self.image.getchannel("A").getextrema()[0] == 255
+
+    def paint(self, canvas, xy, blend=True):
+        if(blend):
+            canvas.paste(self.image, box=xy, mask=self.image)
+        else:
+            canvas.paste(self.image, box=xy)
+
+    def render(self):
+        return self.image
+
+
+class BoxNode:
+    # a container: solid background plus children at offsets relative to its upper left
+    # children are pasted with themselves as mask, or copied when blend is False
+    def __init__(self, size, bg, children, blend=True):
+        self.size = size
+        self.bg = tuple(bg)
+        if(len(self.bg) == 3):
+            self.bg = self.bg+(255, )
+        self.children = children    # list of (node, (left, top))
+        self.blend = blend
+        self._binary = None
+        self._opaque = None
+
+    def _bg_alpha(self):
+        return self.bg[3]
+
+    def binary_alpha(self):
+        if(self._binary is None):
+            self._binary = self._bg_alpha() in (0, 255) and all(
+                i.binary_alpha() for i, box in self.children)
+        return self._binary
+
+    def opaque(self):
+        # its own bitmap would be fully opaque, so pasting it with mask is a plain copy
+        if(self._opaque is None):
+            if(self._bg_alpha() != 255):
+                self._opaque = False
+            elif(self.blend):
+                self._opaque = all(i.binary_alpha() for i, box in self.children)
+            else:
+                self._opaque = all(i.opaque() for i, box in self.children)
+        return self._opaque
+
+    def contained(self):
+        # children never draw outside of this box
+        w, h = self.size
+        for i, box in self.children:
+            left, top = box
+            _w, _h = i.size
+            if(left < 0 or top < 0 or left+_w > w or top+_h > h):
+                return False
+        return True
+
+    def paint(self, canvas, xy, blend=True):
+        x, y = xy
+        if(not self.contained() or (blend and not self.opaque())):
+            scratch = Image.new("RGBA", self.size)
+            self._paint_children(scratch, 0, 0)
+            if(blend):
+                canvas.paste(scratch, box=xy, mask=scratch)
+            else:
+                canvas.paste(scratch, box=xy)
+            return
+        self._paint_children(canvas, x, y)
+
+    def _paint_children(self, canvas, x, y):
+        w, h = self.size
+        canvas.paste(self.bg, (x, y, x+w, y+h))
+        for i, box in self.children:
+            i.paint(canvas, (x+box[0], y+box[1]), blend=self.blend)
+
+    def render(self):
+        ret = Image.new("RGBA", self.size)
+        self.paint(ret, (0, 0), blend=False)
+        return ret
+
+
+def paint(node):
+    # rasterize a measured tree, same pixels as rendering the widget tree directly
+    return node.render()
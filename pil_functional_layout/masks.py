@@ -0,0 +1,55 @@
+from PIL import Image, ImageDraw, ImageChops
+from functools import lru_cache
+# antialiased shape masks
+# shapes are drawn at supersample times the size and box-reduced, once per
+# (shape, size, supersample). the returned masks are shared between renders and
+# threads, don't draw on them.
+
+
+def _size(size):
+    if(isinstance(size, int)):
+        return (size, size)
+    return tuple(int(i) for i in size)
+
+
+@lru_cache(maxsize=256)
+def _circle(size, supersample):
+    w, h = size
+    ret = Image.new("L", (w*supersample, h*supersample), 0)
+    dr = ImageDraw.Draw(ret)
+    dr.ellipse((0, 0, w*supersample-1, h*supersample-1), fill=255)
+    return ret.reduce(supersample)
+
+
+@lru_cache(maxsize=256)
+def _rounded_rect(size, radius, supersample):
+    w, h = size
+    ret = Image.new("L", (w*supersample, h*supersample), 0)
+    dr = ImageDraw.Draw(ret)
+    dr.rounded_rectangle((0, 0, w*supersample-1, h*supersample-1),
+                         radius*supersample, fill=255)
+    return ret.reduce(supersample)
+
+
+def circle(size, supersample=4):
+    # ellipse filling size, an int for a circle or (width, height)
+    return _circle(_size(size), supersample)
+
+
+def rounded_rect(size, radius, supersample=4):
+    return _rounded_rect(_size(size), radius, supersample)
+
+
+def shaped(im, mask):
+    # im with its alpha multiplied by mask, ready for alpha_composite
+    alpha = mask
+    if(im.mode == "RGBA"):
+        alpha = ImageChops.multiply(im.getchannel("A"), mask)
+    ret = im.convert("RGBA")
+    ret.putalpha(alpha)
+    return ret
+
+
+def filled(mask, fill):
+    # fill color in the shape of mask
+    return shaped(Image.new("RGBA", mask.size, tuple(fill)), mask)
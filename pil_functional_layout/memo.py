@@ -0,0 +1,306 @@
+from PIL import Image
+from collections import OrderedDict
+from inspect import signature, Parameter
+from contextlib import contextmanager
+import threading
+import weakref
+try:
+    from .colors import color
+except ImportError:
+    from colors import color
+# subtree render memoization
+# while a RenderCache is active, every widget rendered through _render_content is cached
+# on the values of the kwargs keys that it and its descendants read.
+# reads are declared, not observed: widgets list the keys their render() looks up in
+# kwargsKeys, functions can be decorated with reads(...), otherwise a function's named
+# parameters are used. kwargsKeys = None (or a function taking **kwargs without a
+# declaration) means anything may be read, such subtrees are never cached.
+# cached images are shared, widgets must not draw on the images of their children.
+
+_state = threading.local()
+_sig_keys = weakref.WeakKeyDictionary()
+_MISSING = object()
+
+
+class _Unhashable(Exception):
+    pass
+
+
+def reads(*keys):
+    # declare which kwargs a content callable depends on
+    def deco(func):
+        func.kwargsKeys = tuple(keys)
+        return func
+    return deco
+
+
+def kwargs_keys(func):
+    keys = getattr(func, "kwargsKeys", _MISSING)
+    if(keys is not _MISSING):
+        return keys
+    try:
+        return _sig_keys[func]
+    except (KeyError, TypeError):
+        pass
+    try:
+        params = signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return None
+    keys = []
+    for i in params:
+        if(i.kind == Parameter.VAR_KEYWORD):
+            keys = None
+            break
+        if(i.kind in (Parameter.POSITIONAL_OR_KEYWORD, Parameter.KEYWORD_ONLY)):
+            keys.append(i.name)
+    if(keys is not None):
+        keys = tuple(keys)
+    try:
+        _sig_keys[func] = keys
+    except TypeError:
+        pass
+    return keys
+
+
+class _Frame:
+    def __init__(self):
+        self.keys = set()
+        self.unknown = False
+
+    def add(self, keys):
+        if(keys is None):
+            self.unknown = True
+        else:
+            self.keys.update(keys)
+
+    def merge(self, other):
+        self.unknown = self.unknown or other.unknown
+        self.keys.update(other.keys)
+
+
+def _frames():
+    frames = getattr(_state, "frames", None)
+    if(frames is None):
+        frames = _state.frames = []
+    return frames
+
+
+def record(func):
+    # called for every content callable and widget evaluated with kwargs
+    frames = getattr(_state, "frames", None)
+    if(frames):
+        frames[-1].add(kwargs_keys(func))
+
+
+def active_cache():
+    return getattr(_state, "cache", None)
+
+
+def run_detached(cache, func, args, kwargs):
+    # call func as if on a fresh thread with cache active, for rendering on pool threads.
+    # returns (result, frame), the caller hands the frame to merge() on its own thread
+    prev_cache = active_cache()
+    prev_frames = getattr(_state, "frames", None)
+    frame = _Frame()
+    _state.cache = cache
+    _state.frames = [frame]
+    try:
+        return func(*args, **kwargs), frame
+    finally:
+        _state.cache = prev_cache
+        _state.frames = prev_frames
+
+
+def taint():
+    # the current subtree rendered with placeholder content, don't cache it
+    frames = getattr(_state, "frames", None)
+    if(frames):
+        frames[-1].unknown = True
+
+
+def call_key(func, kwargs, refs):
+    # hashable key for func called with kwargs, on the keys it declares reading
+    keys = kwargs_keys(func)
+    keys = tuple(sorted(kwargs if keys is None else keys))
+    try:
+        values = tuple(_freeze(kwargs.get(k, _MISSING), refs) for k in keys)
+    except _Unhashable:
+        refs.extend(kwargs.get(k) for k in keys)
+        values = tuple(id(kwargs.get(k)) for k in keys)
+    return (func, keys, values)
+
+
+def merge(frame):
+    # add the reads of a detached call to the current frame
+    frames = getattr(_state, "frames", None)
+    if(frames):
+        frames[-1].merge(frame)
+
+
+def _freeze(value, refs):
+    if(value is None or isinstance(value, (str, bytes, int, float, bool))):
+        return value
+    if(isinstance(value, color)):
+        return ("color", tuple(value))
+    if(isinstance(value, (list, tuple))):
+        return (type(value).__name__, )+tuple(_freeze(i, refs) for i in value)
+    if(isinstance(value, dict)):
+        return ("dict", )+tuple(sorted((k, _freeze(v, refs)) for k, v in value.items()))
+    if(isinstance(value, Image.Image)):
+        # keyed by identity, the entry keeps the image alive so the id isn't reused,
+        # its bytes count toward the entry's
+        refs.append(value)
+        return ("image", id(value))
+    try:
+        hash(value)
+    except TypeError:
+        raise _Unhashable(value)
+    return value
+
+
+def _nbytes(image):
+    return image.width*image.height*len(image.getbands())
+
+
+class RenderCache:
+    def __init__(self, max_bytes=256 << 20):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> (image, nbytes, refs)
+        self._depsets = dict()          # widget -> [frozenset of keys]
+        self._counts = dict()           # (widget, keys) -> number of entries
+        self._lock = threading.Lock()
+
+    def _key(self, widget, keys, kwargs, refs):
+        try:
+            values = tuple(_freeze(kwargs.get(k, _MISSING), refs)
+                           for k in sorted(keys))
+        except _Unhashable:
+            return None
+        return (widget, keys, values)
+
+    def _lookup(self, widget, kwargs):
+        with self._lock:
+            depsets = list(self._depsets.get(widget, ()))
+        for keys in depsets:
+            key = self._key(widget, keys, kwargs, [])
+            if(key is None):
+                continue
+            with self._lock:
+                entry = self._entries.get(key)
+                if(entry is not None):
+                    self._entries.move_to_end(key)
+                    return keys, entry[0]
+        return None, None
+
+    def _store(self, widget, keys, kwargs, image):
+        refs = []
+        key = self._key(widget, keys, kwargs, refs)
+        if(key is None):
+            return
+        # the images kept alive as keys are paid for too
+        nbytes = _nbytes(image)+sum(_nbytes(i)
+                                    for i in refs if isinstance(i, Image.Image))
+        if(nbytes > self.max_bytes):
+            return
+        with self._lock:
+            if(key in self._entries):
+                return
+            depsets = self._depsets.setdefault(widget, [])
+            if(keys not in depsets):
+                depsets.append(keys)
+            self._counts[(widget, keys)] = self._counts.get((widget, keys), 0)+1
+            self._entries[key] = (image, nbytes, refs)
+            self.bytes += nbytes
+            while(self.bytes > self.max_bytes):
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        # called locked, a widget's key sets go with its last entry using them
+        image, nbytes, refs = self._entries.pop(key)
+        self.bytes -= nbytes
+        widget, keys, values = key
+        n = self._counts.pop((widget, keys))-1
+        if(n):
+            self._counts[(widget, keys)] = n
+            return
+        depsets = self._depsets[widget]
+        depsets.remove(keys)
+        if(not depsets):
+            del self._depsets[widget]
+
+    def render_widget(self, widget, kwargs):
+        frames = _frames()
+        keys, image = self._lookup(widget, kwargs)
+        with self._lock:
+            if(image is not None):
+                self.hits += 1
+            else:
+                self.misses += 1
+        if(image is not None):
+            if(frames):
+                frames[-1].add(keys)
+            return image
+        frame = _Frame()
+        frame.add(kwargs_keys(widget))
+        frames.append(frame)
+        try:
+            image = widget.render(**kwargs)
+        finally:
+            frames.pop()
+        if(frames):
+            frames[-1].merge(frame)
+        if(not frame.unknown and isinstance(image, Image.Image)):
+            self._store(widget, frozenset(frame.keys), kwargs, image)
+        return image
+
+    @contextmanager
+    def active(self):
+        prev = active_cache()
+        _state.cache = self
+        try:
+            yield self
+        finally:
+            _state.cache = prev
+
+    def _unshared(self, image):
+        # a copy of image if it's one of the entries
+        if(isinstance(image, Image.Image)):
+            with self._lock:
+                cached = any(entry[0] is image for entry in self._entries.values())
+            if(cached):
+                return image.copy()
+        return image
+
+    def render(self, widget, **kwargs):
+        # the root itself is not cached. roots passing a child's image through (SetFont,
+        # SetKwargs...) would return a cached one, it's copied so the result is never shared
+        with self.active():
+            return self._unshared(widget.render(**kwargs))
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self.bytes,
+                    "max_bytes": self.max_bytes, "entries": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._depsets.clear()
+            self._counts.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+def use_render_cache(cache):
+    return cache.active()
+
+
+def render_widget(widget, kwargs):
+    cache = active_cache()
+    if(cache is None):
+        return widget.render(**kwargs)
+    return cache.render_widget(widget, kwargs)
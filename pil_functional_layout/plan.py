@@ -0,0 +1,265 @@
+from PIL import Image
+try:
+    from .widgets import *
+    from .widgets import _render_content, _as_rgba, _composite
+    from .quality import get_quality
+except ImportError:
+    from widgets import *
+    from widgets import _render_content, _as_rgba, _composite
+    from quality import get_quality
+# compiled templates
+# Widget.compile() walks the tree once and turns it into a flat list of operations run
+# on a value stack: containers push their children's kwargs on enter and composite the
+# top n images on exit, everything else is a leaf rendered through _render_content.
+# settings that don't depend on kwargs are resolved at compile time, static images are
+# converted once. the tree is snapshotted, changing widget attributes afterwards
+# needs a new compile(). plans run their operations in order, executors set on
+# containers aren't used.
+
+
+class _Probe(dict):
+    # records which kwargs a _settings() call looked up
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.read = set()
+
+    def get(self, key, default=None):
+        self.read.add(key)
+        return super().get(key, default)
+
+    def __getitem__(self, key):
+        self.read.add(key)
+        return super().__getitem__(key)
+
+    def pop(self, key, *default):
+        self.read.add(key)
+        return super().pop(key, *default)
+
+
+def _same(a, b):
+    if(isinstance(a, (tuple, list)) and isinstance(b, (tuple, list))):
+        return len(a) == len(b) and all(_same(i, j) for i, j in zip(a, b))
+    return a is b or a == b
+
+
+def _constant_settings(node):
+    # returns (settings, kwargs updates) when node._settings gives the same answer
+    # whatever the looked up kwargs are, else None
+    empty = _Probe()
+    settings = node._settings(empty)
+    filled = _Probe({k: object() for k in empty.read})
+    other = node._settings(filled)
+    updates = {k: v for k, v in empty.items()}
+    other_updates = {k: v for k, v in filled.items() if k in updates}
+    if(not _same(settings, other)):
+        return None
+    if(not all(_same(updates[k], other_updates.get(k)) for k in updates)):
+        return None
+    return settings, updates
+
+
+class _State:
+    def __init__(self, kwargs):
+        self.kwargs = [kwargs]
+        self.settings = []
+        self.values = []
+
+
+class Plan:
+    # with a RenderCache, leaves whose declared kwargs didn't change are reused,
+    # so only the dynamic parts are evaluated. without one a plan saves little, the
+    # time goes to the leaves, mostly text, not to walking the tree
+    def __init__(self, widget, ops, cache=None):
+        self.widget = widget
+        self.ops = ops
+        self.cache = cache
+        self._passthrough = _passes_image(widget)
+
+    def _run(self, kwargs):
+        state = _State(kwargs)
+        for op in self.ops:
+            op(state)
+        ret = state.values.pop()
+        if(self._passthrough):
+            # the root's image is the one given as content, see widgets._render_through
+            ret = ret.copy()
+        return ret
+
+    def render(self, **kwargs):
+        if(self.cache is None):
+            return self._run(kwargs)
+        with self.cache.active():
+            return self.cache._unshared(self._run(kwargs))
+
+    __call__ = render
+
+    def __len__(self):
+        return len(self.ops)
+
+
+def _leaf(content):
+    if(isinstance(content, Image.Image)):
+        image = _as_rgba(content)
+
+        def op(state):
+            state.values.append(image)
+        return op
+
+    def op(state):
+        state.values.append(_render_content(content, **state.kwargs[-1]))
+    return op
+
+
+def _push_list(n):
+    def op(state):
+        values = state.values
+        ret = values[-n:] if n else []
+        del values[len(values)-n:]
+        values.append(ret)
+    return op
+
+
+def _enter(node):
+    constant = _constant_settings(node)
+    if(constant is not None):
+        settings, updates = constant
+
+        def op(state):
+            kwargs = state.kwargs[-1]
+            if(updates):
+                kwargs = dict(kwargs)
+                kwargs.update(updates)
+            state.kwargs.append(kwargs)
+            state.settings.append(settings)
+        return op
+
+    def op(state):
+        kwargs = dict(state.kwargs[-1])
+        state.settings.append(node._settings(kwargs))
+        state.kwargs.append(kwargs)
+    return op
+
+
+def _pop(state, n):
+    values = state.values
+    ret = values[len(values)-n:]
+    del values[len(values)-n:]
+    state.kwargs.pop()
+    return ret, state.settings.pop()
+
+
+def _exit_row(node, n):
+    # Row and Column
+    resizes = node._resizes()
+
+    def op(state):
+        quality = get_quality(state.kwargs[-1])
+        r_contents, settings = _pop(state, n)
+        bg, borderWidth, align, outer_border, extent = settings
+        if(resizes):
+            r_contents = node._resize_contents(r_contents, quality)
+        size, boxes = node._arrange(
+            [i.size for i in r_contents], borderWidth, align, outer_border, extent)
+        state.values.append(_composite(size, bg, zip(r_contents, boxes)))
+    return op
+
+
+def _exit_grid(node, n):
+    def op(state):
+        contents, settings = _pop(state, n)
+        borderWidth, outerBorder, rankdir, bg, alignX, alignY = settings
+        size, placed = node._arrange(
+            contents, borderWidth, outerBorder, rankdir, alignX, alignY)
+        state.values.append(_composite(size, bg, placed))
+    return op
+
+
+def _exit_border(node):
+    def op(state):
+        content = state.values.pop()
+        kwargs = state.kwargs[-1]
+        borderWidth, borderColor, size = node._settings(content.size, kwargs)
+        ret = Image.new("RGBA", size, tuple(borderColor))
+        ret.paste(content, box=(borderWidth, borderWidth))
+        state.values.append(ret)
+    return op
+
+
+def _enter_kwargs(updates):
+    def op(state):
+        kwargs = dict(state.kwargs[-1])
+        kwargs.update(updates)
+        state.kwargs.append(kwargs)
+    return op
+
+
+def _enter_font(node):
+    def op(state):
+        kwargs = dict(state.kwargs[-1])
+        kwargs['font'] = node.font or kwargs.get('font')
+        kwargs['fontSize'] = node.fontSize or kwargs.get('fontSize')
+        kwargs['lang'] = node.lang or kwargs.get('lang')
+        state.kwargs.append(kwargs)
+    return op
+
+
+def _exit_kwargs(state):
+    state.kwargs.pop()
+
+
+def _compile_child(node, content, ops):
+    updates = node._passed_down(content)
+    if(updates):
+        ops.append(_enter_kwargs(updates))
+        _compile(content, ops)
+        ops.append(_exit_kwargs)
+    else:
+        _compile(content, ops)
+
+
+def _compile(content, ops):
+    if(isinstance(content, list)):
+        for i in content:
+            _compile(i, ops)
+        ops.append(_push_list(len(content)))
+    elif(type(content) in (Row, Column)):
+        ops.append(_enter(content))
+        for i in content.contents:
+            _compile_child(content, i, ops)
+        ops.append(_exit_row(content, len(content.contents)))
+    elif(type(content) is Grid):
+        ops.append(_enter(content))
+        for i in content.contents:
+            _compile(i, ops)
+        ops.append(_exit_grid(content, len(content.contents)))
+    elif(type(content) is AddBorder):
+        _compile(content.content, ops)
+        ops.append(_exit_border(content))
+    elif(type(content) is SetKwargs):
+        ops.append(_enter_kwargs(dict(content.kwargs)))
+        _compile(content.content, ops)
+        ops.append(_exit_kwargs)
+    elif(type(content) is SetFont):
+        ops.append(_enter_font(content))
+        _compile(content.content, ops)
+        ops.append(_exit_kwargs)
+    elif(content is None):
+        ops.append(_push_none)
+    else:
+        ops.append(_leaf(content))
+
+
+def _passes_image(content):
+    while(type(content) in (SetKwargs, SetFont)):
+        content = content.content
+    return isinstance(content, Image.Image)
+
+
+def _push_none(state):
+    state.values.append(None)
+
+
+def compile_widget(widget, cache=None):
+    ops = []
+    _compile(widget, ops)
+    return Plan(widget, ops, cache=cache)
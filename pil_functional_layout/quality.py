@@ -0,0 +1,43 @@
+from PIL import Image
+# render quality profiles
+# render(quality="draft") trades resampling and text antialiasing quality for speed,
+# e.g. for previews and thumbnails. the profile is inherited through kwargs like any
+# other setting. "final" is the default and renders exactly as without a profile.
+
+
+class Quality:
+    def __init__(self, resample=Image.LANCZOS, reducing_gap=None, fontmode="L", supersample=4):
+        """
+            resample: filter for every resize
+            reducing_gap: let large downscales reduce() by an integer factor first
+            fontmode: "L" for antialiased text, "1" for aliased
+            supersample: for antialiased masks, see masks
+        """
+        self.resample = resample
+        self.reducing_gap = reducing_gap
+        self.fontmode = fontmode
+        self.supersample = supersample
+
+    def resize_args(self):
+        # keyword arguments for the resize module helpers
+        return {"resample": self.resample, "reducing_gap": self.reducing_gap}
+
+    def resize(self, im, size):
+        return im.resize(size, self.resample, reducing_gap=self.reducing_gap)
+
+
+profiles = {
+    "draft": Quality(Image.BILINEAR, reducing_gap=2.0, fontmode="1", supersample=1),
+    "balanced": Quality(Image.BICUBIC, reducing_gap=3.0, supersample=2),
+    "final": Quality(),
+}
+
+
+def get_quality(kwargs):
+    # quality kwarg: a profile name, a Quality, or None for "final"
+    quality = kwargs.get("quality")
+    if(quality is None):
+        return profiles["final"]
+    if(isinstance(quality, Quality)):
+        return quality
+    return profiles[quality]
@@ -1,21 +1,63 @@
 from PIL import Image
 
 
-def stretchHeight(img, height):
+class Resized:
+    # an image with a pending resize: the source pixels in box, scaled to size.
+    # has the size, resize() and crop() of an Image, so the helpers below work on it,
+    # but consecutive scales and crops only move the box. materialize() resamples once
+    def __init__(self, image, box=None, size=None, resample=Image.LANCZOS, reducing_gap=None):
+        self.image = image
+        self.box = box or (0, 0)+image.size
+        self.size = tuple(size or image.size)
+        self.resample = resample
+        self.reducing_gap = reducing_gap
+
+    def resize(self, size, resample=Image.LANCZOS, reducing_gap=None):
+        return Resized(self.image, self.box, size, resample, reducing_gap)
+
+    def crop(self, box):
+        left, upper, right, lower = box
+        w, h = self.size
+        if(left < 0 or upper < 0 or right > w or lower > h):
+            # padding, only a real image can do that
+            return self.materialize().crop(box)
+        x0, y0, x1, y1 = self.box
+        sx = (x1-x0)/w
+        sy = (y1-y0)/h
+        box = (x0+left*sx, y0+upper*sy, x0+right*sx, y0+lower*sy)
+        return Resized(self.image, box, (right-left, lower-upper), self.resample, self.reducing_gap)
+
+    def materialize(self):
+        x0, y0, x1, y1 = self.box
+        if(self.size == (x1-x0, y1-y0) and all(isinstance(i, int) for i in self.box)):
+            if(self.box == (0, 0)+self.image.size):
+                return self.image
+            return self.image.crop(self.box)
+        return self.image.resize(self.size, self.resample, box=self.box, reducing_gap=self.reducing_gap)
+
+
+def materialize(img):
+    if(isinstance(img, Resized)):
+        return img.materialize()
+    return img
+
+
+def stretchHeight(img, height, resample=Image.LANCZOS, reducing_gap=None):
     w, h = img.size
     rate = height/h
     w = int(w*rate)
-    return img.resize((w, int(height)), Image.LANCZOS)
+    return img.resize((w, int(height)), resample, reducing_gap=reducing_gap)
 
 
-def stretchWidth(img, width):
+def stretchWidth(img, width, resample=Image.LANCZOS, reducing_gap=None):
     w, h = img.size
     rate = width/w
     h = int(h*rate)
-    return img.resize((int(width), h), Image.LANCZOS)
+    return img.resize((int(width), h), resample, reducing_gap=reducing_gap)
 
 
 def expandHeight(img, height, bg=(0, 0, 0, 0)):
+    img = materialize(img)
     w, h = img.size
     ret = Image.new(img.mode, (w, height), tuple(bg))
     top = int((height-h)/2)
@@ -24,6 +66,7 @@ def expandHeight(img, height, bg=(0, 0, 0, 0)):
 
 
 def expandWidth(img, width, bg=(0, 0, 0, 0)):
+    img = materialize(img)
     w, h = img.size
     ret = Image.new(img.mode, (width, h), tuple(bg))
     left = int((width-w)/2)
@@ -48,18 +91,21 @@ def cropHeight(img, height):
     return img.crop((0, upper, w, upper+height))
 
 
-def cropWH(img, size):
+def cropWH(img, size, resample=Image.LANCZOS, reducing_gap=None):
+    if(isinstance(img, Image.Image)):
+        # stretch and crop in one resample
+        return cropWH(Resized(img), size, resample, reducing_gap).materialize()
     width, height = size
     rate = width/height
     w, h = img.size
     r = w/h
     if(r > rate):
-        return cropWidth(stretchHeight(img, height), width)
+        return cropWidth(stretchHeight(img, height, resample, reducing_gap), width)
     else:
-        return cropHeight(stretchWidth(img, width), height)
+        return cropHeight(stretchWidth(img, width, resample, reducing_gap), height)
 
 
-def stretchIfExceeds(im, size):
+def stretchIfExceeds(im, size, resample=Image.LANCZOS, reducing_gap=None):
     width, height = size
     w, h = im.size
     r = w/h
@@ -67,15 +113,15 @@ def stretchIfExceeds(im, size):
         rate = width/height
         if(r > rate):
             if(w > width):
-                return stretchWidth(im, width)
+                return stretchWidth(im, width, resample, reducing_gap)
         elif(h > height):
-            return stretchHeight(im, height)
+            return stretchHeight(im, height, resample, reducing_gap)
     elif(width):
         if(w > width):
-            return stretchWidth(im, width)
+            return stretchWidth(im, width, resample, reducing_gap)
     elif(height):
         if(h > height):
-            return stretchHeight(im, height)
+            return stretchHeight(im, height, resample, reducing_gap)
     return im
 
 
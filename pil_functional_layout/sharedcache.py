@@ -0,0 +1,210 @@
+from PIL import Image
+from hashlib import blake2b
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import weakref
+# decoded images shared between processes
+# SharedImageCache keeps decoded RGBA pixels as files in a directory on a memory backed
+# file system, /dev/shm by default. processes map the files read only and wrap them with
+# Image.frombuffer, so all workers share one copy of each image. an ImageCache with one
+# as its shared backend looks there before decoding and puts what it decodes.
+# - entries are written to a temporary file and renamed into place, nobody maps a
+#   partial one
+# - a process holds a shared flock on an entry while an image mapped on it is alive.
+#   the kernel keeps count and drops them with the process, crashed workers included
+# - the entries of all processes are kept under max_bytes: before adding one, the least
+#   recently used entries nobody holds are unlinked, under an exclusive lock on the
+#   directory's lock file. unlinking only removes the name, existing mappings stay valid
+#   until they're dropped
+# every get() returns a new image over the shared pixels, read only: drawing on it makes
+# PIL copy them into that image first, other images of the entry are left as they were.
+# posix only.
+
+_MAGIC = b"PFLI"
+_HEADER = struct.Struct("<4sII")     # magic, width, height
+_SUFFIX = ".rgba"
+
+
+def _default_path():
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(root, "pil_functional_layout-%d" % os.getuid())
+
+
+class SharedImageCache:
+    def __init__(self, path=None, max_bytes=1 << 30):
+        self.path = path or _default_path()
+        os.makedirs(self.path, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._mapped = dict()    # entry name -> weakref of its _Mapping in this process
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # pickled as where to attach, e.g. for spawned workers
+        return (SharedImageCache, (self.path, self.max_bytes))
+
+    def _name(self, key):
+        # key: made of str, bytes and numbers so its repr is the same in every process
+        return blake2b(repr(key).encode(), digest_size=20).hexdigest()+_SUFFIX
+
+    def _map(self, name):
+        try:
+            fd = os.open(os.path.join(self.path, name), os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            mm = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+            magic, width, height = _HEADER.unpack_from(mm)
+            if(magic != _MAGIC or len(mm) != _HEADER.size+width*height*4):
+                raise ValueError("%s is not a cache entry" % name)
+            os.utime(fd)    # for least recently used eviction
+        except BaseException:
+            os.close(fd)
+            raise
+        ret = _Mapping(mm, (width, height))
+        # the lock, and so the reference, goes with the mapping
+        weakref.finalize(ret, os.close, fd)
+        return ret
+
+    def _attach(self, name):
+        # a new image on the entry's mapping, mapped once per process
+        with self._lock:
+            ref = self._mapped.get(name)
+            mapping = ref() if ref is not None else None
+        if(mapping is None):
+            mapping = self._map(name)
+            if(mapping is None):
+                return None
+            with self._lock:
+                self._mapped[name] = weakref.ref(mapping)
+        return mapping.image()
+
+    def get(self, key):
+        im = self._attach(self._name(key))
+        with self._lock:
+            if(im is None):
+                self.misses += 1
+            else:
+                self.hits += 1
+        return im
+
+    def put(self, key, im):
+        # returns the shared copy of im, or im itself if it can't be fit in max_bytes
+        if(im.mode != "RGBA"):
+            im = im.convert("RGBA")
+        nbytes = _HEADER.size+im.width*im.height*4
+        if(nbytes > self.max_bytes):
+            return im
+        name = self._name(key)
+        tmp = os.path.join(self.path, ".%s.%d.%d.tmp" %
+                           (name, os.getpid(), threading.get_ident()))
+        with _DirLock(self.path):
+            if(os.path.exists(os.path.join(self.path, name))):
+                # another process decoded it meanwhile
+                return self._attach(name) or im
+            if(not self._make_room(nbytes)):
+                return im
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, im.width, im.height))
+                    f.write(im.tobytes())
+                os.rename(tmp, os.path.join(self.path, name))
+            except BaseException:
+                if(os.path.exists(tmp)):
+                    os.unlink(tmp)
+                raise
+        with self._lock:
+            self._mapped.pop(name, None)
+        return self._attach(name) or im
+
+    def _entries(self):
+        ret = []
+        with os.scandir(self.path) as it:
+            for i in it:
+                if(i.name.endswith(_SUFFIX)):
+                    try:
+                        st = i.stat()
+                    except FileNotFoundError:
+                        continue
+                    ret.append((st.st_mtime_ns, st.st_size, i.name))
+        return ret
+
+    def _evict(self, name):
+        # unlinks the entry unless some process holds it
+        try:
+            fd = os.open(os.path.join(self.path, name), os.O_RDONLY)
+        except FileNotFoundError:
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        try:
+            os.unlink(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+        return True
+
+    def _make_room(self, nbytes):
+        # called with the directory locked
+        entries = sorted(self._entries())
+        total = sum(size for mtime, size, name in entries)
+        for mtime, size, name in entries:
+            if(total+nbytes <= self.max_bytes):
+                break
+            if(self._evict(name)):
+                total -= size
+        return total+nbytes <= self.max_bytes
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            mapped = sum(1 for i in self._mapped.values() if i() is not None)
+            return {"hits": self.hits, "misses": self.misses, "entries": len(entries),
+                    "bytes": sum(size for mtime, size, name in entries),
+                    "max_bytes": self.max_bytes, "mapped": mapped}
+
+    def clear(self):
+        # unlinks every entry no process holds
+        with _DirLock(self.path):
+            for mtime, size, name in self._entries():
+                self._evict(name)
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+class _Mapping:
+    __slots__ = ("mm", "size", "__weakref__")
+
+    def __init__(self, mm, size):
+        self.mm = mm
+        self.size = size
+
+    def image(self):
+        ret = Image.frombuffer("RGBA", self.size, memoryview(
+            self.mm)[_HEADER.size:], "raw", "RGBA", 0, 1)
+        ret._mapping = self    # keeps the mapping, and its lock, alive with the image
+        return ret
+
+
+class _DirLock:
+    # exclusive between processes and threads, every use opens its own description
+    def __init__(self, path):
+        self.path = os.path.join(path, ".lock")
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
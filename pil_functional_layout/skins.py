@@ -0,0 +1,123 @@
+from PIL import Image
+from collections import OrderedDict
+from os import path
+import threading
+try:
+    from .imagecache import load_image
+except ImportError:
+    from imagecache import load_image
+# 9-slice skins for bubble
+# the pieces are loaded and mirrored once. resized pieces are cached: corners per border
+# size, edges and the middle per length. a piece that doesn't change along an axis
+# is stretched from a 1 pixel strip, only the other axis is resampled.
+
+PIECES = ['lu', 'up', 'ru', 'le', 'mi', 'ri', 'll', 'lo', 'rl']
+_dir_skins = dict()
+_dir_lock = threading.Lock()
+
+
+def _uniform(im):
+    # (same along x, same along y)
+    w, h = im.size
+    data = im.tobytes()
+    col = im.crop((0, 0, 1, h)).resize((w, h), Image.NEAREST)
+    row = im.crop((0, 0, w, 1)).resize((w, h), Image.NEAREST)
+    return col.tobytes() == data, row.tobytes() == data
+
+
+def _strip(im, size, uniform, resample):
+    # im resampled to size, a uniform axis is cut down to 1 pixel first
+    ux, uy = uniform
+    if(ux):
+        im = im.crop((0, 0, 1, im.height))
+    if(uy):
+        im = im.crop((0, 0, im.width, 1))
+    if(size != im.size):
+        im = im.resize(size, resample)
+    return im
+
+
+class BubbleSkin:
+    def __init__(self, lu, up, le, mi, ru=None, ri=None, ll=None, lo=None, rl=None, maxsize=512):
+        if(ru is None):
+            ru = lu.transpose(Image.FLIP_LEFT_RIGHT)
+        if(ri is None):
+            ri = le.transpose(Image.FLIP_LEFT_RIGHT)
+        if(rl is None):
+            rl = lu.transpose(Image.ROTATE_180)
+        if(lo is None):
+            lo = up.transpose(Image.FLIP_TOP_BOTTOM)
+        if(ll is None):
+            ll = lu.transpose(Image.FLIP_TOP_BOTTOM)
+        self.pieces = dict(lu=lu, up=up, ru=ru, le=le, mi=mi,
+                           ri=ri, ll=ll, lo=lo, rl=rl)
+        self.pieces = {k: v.convert("RGBA") for k, v in self.pieces.items()}
+        self.uniform = {k: _uniform(v) for k, v in self.pieces.items()}
+        self.maxsize = maxsize
+        self._resized = OrderedDict()
+        self._lock = threading.Lock()
+
+    def from_dir(pth):
+        # skins are shared per directory, until one of the files changes
+        pth = path.abspath(pth)
+        pieces = dict()
+        for i in PIECES:
+            if(path.exists(path.join(pth, i+'.png'))):
+                pieces[i] = load_image(path.join(pth, i+'.png'))
+        ids = tuple(id(pieces.get(i)) for i in PIECES)
+        with _dir_lock:
+            skin, _ids = _dir_skins.get(pth, (None, None))
+            if(skin is not None and _ids == ids):
+                return skin
+        skin = BubbleSkin(**pieces)
+        with _dir_lock:
+            # the ids stay valid as long as the skin keeps the images alive
+            skin._sources = pieces
+            _dir_skins[pth] = (skin, ids)
+        return skin
+
+    def replace(self, **pieces):
+        # a new skin with some of the pieces swapped
+        kwa = dict(self.pieces)
+        kwa.update(pieces)
+        return BubbleSkin(**kwa)
+
+    def piece(self, name, size, resample=Image.LANCZOS):
+        # uniform axes are cached 1 pixel wide and stretched with NEAREST
+        ux, uy = self.uniform[name]
+        small = (1 if ux else size[0], 1 if uy else size[1])
+        key = (name, small, resample)
+        with self._lock:
+            ret = self._resized.get(key)
+            if(ret is not None):
+                self._resized.move_to_end(key)
+        if(ret is None):
+            ret = _strip(self.pieces[name], small, (ux, uy), resample)
+            with self._lock:
+                self._resized[key] = ret
+                while(len(self._resized) > self.maxsize):
+                    self._resized.popitem(last=False)
+        if(small != size):
+            ret = ret.resize(size, Image.NEAREST)
+        return ret
+
+    def frame(self, inner, border_size, resample=Image.LANCZOS):
+        # the frame around an inner (width, height), border_size thick
+        _, __ = inner
+        bs = border_size
+        ret = Image.new("RGBA", (_+bs*2, __+bs*2))
+
+        def piece(name, size):
+            return self.piece(name, size, resample)
+        ret.paste(piece('lu', (bs, bs)), (0, 0))
+        ret.paste(piece('up', (_, bs)), (bs, 0))
+        ret.paste(piece('ru', (bs, bs)), (bs+_, 0))
+
+        ret.paste(piece('le', (bs, __)), (0, bs))
+        ret.paste(piece('mi', (_, __)), (bs, bs))
+        ret.paste(piece('ri', (bs, __)), (bs+_, bs))
+
+        ret.paste(piece('ll', (bs, bs)), (0, bs+__))
+        ret.paste(piece('lo', (_, bs)), (bs, bs+__))
+        ret.paste(piece('rl', (bs, bs)), (bs+_, bs+__))
+        return ret
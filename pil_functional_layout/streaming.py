@@ -0,0 +1,170 @@
+from PIL import Image
+from io import BytesIO
+import struct
+import zlib
+try:
+    from .widgets import Column, Grid, _render_content, _solve_content, _paste, _opaque
+    from .quality import get_quality
+except ImportError:
+    from widgets import Column, Grid, _render_content, _solve_content, _paste, _opaque
+    from quality import get_quality
+# band-wise and region rendering of large layouts
+# StreamLayout(widget, **kwargs) lays out a Column or Grid without keeping it whole:
+# every child is rendered once for its size and kept zlib compressed, Column and Grid
+# children are laid out the same way, recursively. region(box) then paints only the
+# children that intersect box into a canvas of the box's size, bands() paints the
+# layout top to bottom one band at a time. children the last painted box overlapped are
+# kept decompressed for the next call. memory is bounded by the box and those children
+# plus the compressed bitmaps, which for text and flat colors are a small part of the
+# whole image.
+# pixels are the same as cropping widget.render(**kwargs). not thread safe.
+
+
+class _Leaf:
+    # a child painted from its own bitmap, rendered once and kept compressed
+    def __init__(self, content, kwargs, resizer, quality):
+        im = _render_content(content, **kwargs)
+        if(resizer is not None):
+            im = resizer._resize_contents([im], quality)[0]
+        self.mode = im.mode
+        self.size = im.size
+        self.opaque = _opaque(im)
+        self.data = zlib.compress(im.tobytes(), 1)
+
+    def render(self):
+        ret = Image.frombytes(self.mode, self.size, zlib.decompress(self.data))
+        if(self.opaque):
+            ret._opaque = True
+        return ret
+
+
+class StreamLayout:
+    def __init__(self, widget, **kwargs):
+        kwargs = dict(kwargs)   # _settings() stores inherited values in it
+        quality = get_quality(kwargs)
+        if(isinstance(widget, Column)):
+            bg, borderWidth, alignX, outer_border, height = widget._settings(kwargs)
+            resizer = widget if widget._resizes() else None
+            children = [self._child(i, widget._child_kwargs(i, kwargs), resizer, quality)
+                        for i in widget.contents]
+            size, boxes = widget._arrange(
+                [i.size for i in children], borderWidth, alignX, outer_border, height)
+            self.children = list(zip(children, boxes))
+        elif(isinstance(widget, Grid)):
+            borderWidth, outerBorder, rankdir, bg, alignX, alignY = widget._settings(
+                kwargs)
+            contents = []
+            for i in widget.contents:
+                if(isinstance(i, list)):
+                    contents.append([self._child(j, kwargs) for j in i])
+                else:
+                    contents.append(self._child(i, kwargs))
+            size, self.children = widget._arrange(
+                contents, borderWidth, outerBorder, rankdir, alignX, alignY)
+        else:
+            raise TypeError("only Column and Grid can be streamed, got %s" % widget)
+        self.bg = tuple(bg)
+        if(len(self.bg) == 3):
+            self.bg = self.bg+(255, )
+        self.size = tuple(int(i) for i in size)
+        self._live = dict()     # id(leaf) -> bitmap, leaves the last box overlapped
+
+    def _child(self, content, kwargs, resizer=None, quality=None):
+        if(content is None):
+            return None
+        solved = _solve_content(content, **kwargs)
+        if(isinstance(solved, (Column, Grid)) and resizer is None):
+            return StreamLayout(solved, **kwargs)
+        return _Leaf(content, kwargs, resizer, quality)
+
+    def region(self, box):
+        # the part of the rendered image inside box (left, upper, right, lower),
+        # transparent where box is outside of it
+        left, top, right, bottom = (int(i) for i in box)
+        w, h = self.size
+        ret = Image.new("RGBA", (right-left, bottom-top))
+        x0, y0, x1, y1 = max(left, 0), max(top, 0), min(right, w), min(bottom, h)
+        if(x0 < x1 and y0 < y1):
+            ret.paste(self.bg, (x0-left, y0-top, x1-left, y1-top))
+        live = dict()
+        for child, (x, y) in self.children:
+            cw, ch = child.size
+            x0, y0 = max(left, x), max(top, y)
+            x1, y1 = min(right, x+cw), min(bottom, y+ch)
+            if(x0 >= x1 or y0 >= y1):
+                continue
+            if(isinstance(child, StreamLayout)):
+                im = child.region((x0-x, y0-y, x1-x, y1-y))
+                _paste(ret, im, (x0-left, y0-top))
+                continue
+            im = self._live.get(id(child))
+            if(im is None):
+                im = child.render()
+            live[id(child)] = im
+            _paste(ret, im, (x-left, y-top))
+        self._live = live
+        return ret
+
+    def bands(self, band_height=256):
+        # yields (top, band) from top to bottom, bands are band_height high but the last
+        w, h = self.size
+        try:
+            for top in range(0, h, band_height):
+                yield top, self.region((0, top, w, min(top+band_height, h)))
+        finally:
+            self._live = dict()
+
+    def save_png(self, fp, band_height=256, compress_level=6):
+        # fp: a writable binary file object or a path
+        if(not hasattr(fp, "write")):
+            with open(fp, "wb") as f:
+                return self.save_png(f, band_height, compress_level)
+        writer = PNGStreamWriter(fp, self.size, compress_level)
+        for top, band in self.bands(band_height):
+            writer.write(band)
+        writer.close()
+
+    def jpeg_tiles(self, band_height=256, **save_kwargs):
+        # yields (top, encoded JPEG) for every band, alpha is dropped
+        save_kwargs.setdefault("quality", 90)
+        for top, band in self.bands(band_height):
+            bio = BytesIO()
+            band.convert("RGB").save(bio, "JPEG", **save_kwargs)
+            yield top, bio.getvalue()
+
+
+class PNGStreamWriter:
+    # RGBA png written as rows come in, the image is never held at once
+    def __init__(self, fp, size, compress_level=6):
+        self.fp = fp
+        self.width, self.height = size
+        self.rows = 0
+        self._zip = zlib.compressobj(compress_level)
+        fp.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, tag, data):
+        self.fp.write(struct.pack(">I", len(data)))
+        self.fp.write(tag)
+        self.fp.write(data)
+        self.fp.write(struct.pack(">I", zlib.crc32(tag+data) & 0xffffffff))
+
+    def write(self, band):
+        # band: the next rows, an image as wide as the png
+        if(band.mode != "RGBA"):
+            band = band.convert("RGBA")
+        data = band.tobytes()
+        stride = self.width*4
+        raw = b"".join(b"\x00"+data[i:i+stride]
+                       for i in range(0, len(data), stride))
+        self.rows += band.height
+        compressed = self._zip.compress(raw)
+        if(compressed):
+            self._chunk(b"IDAT", compressed)
+
+    def close(self):
+        if(self.rows != self.height):
+            raise ValueError("%d rows written, the png is %d high" %
+                             (self.rows, self.height))
+        self._chunk(b"IDAT", self._zip.flush())
+        self._chunk(b"IEND", b"")
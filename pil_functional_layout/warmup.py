@@ -0,0 +1,73 @@
+from time import perf_counter
+from importlib import import_module
+import gc
+import os
+import resource
+try:
+    from .fontcache import font_registry
+    from .imagecache import image_cache
+    from .get_emoji import get_emoji_store
+    from .batch import TemplateFactory
+except ImportError:
+    from fontcache import font_registry
+    from imagecache import image_cache
+    from get_emoji import get_emoji_store
+    from batch import TemplateFactory
+# warming a process up before it forks its workers
+# warmup() fills the process-wide caches (fonts, decoded images and skins, shape masks,
+# gradients, emoji) and runs the first renders in the parent, then
+# freezes the garbage collector so the objects created so far are never touched by a
+# collection. forked children inherit all of it copy on write and serve their first
+# requests hot, e.g. call it before render_many() or before a server forks its workers.
+# the modules widgets only import on first use are imported here too.
+
+_LAZY = ("plan", "streaming", "animation", "encoding")
+
+
+def _rss():
+    # resident bytes now, or the peak where /proc isn't available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+
+
+def warmup(templates=(), fonts=(), sample_kwargs=(), font_sizes=(12, ), emoji=(), freeze=True):
+    """
+        templates: widgets or TemplateFactory, each rendered with every sample_kwargs,
+            once without kwargs if there are none
+        fonts: paths or bytes loaded at every font_sizes, None is the locale's default
+        emoji: codes prefetched at every font_sizes, as RichText asks for them
+        freeze: gc.freeze() at the end, for forking right after
+        returns a report of the time and memory it took, and the cache sizes
+    """
+    start = perf_counter()
+    rss = _rss()
+    renders = 0
+    for name in _LAZY:
+        if(__package__):
+            import_module("."+name, __package__)
+        else:
+            import_module(name)
+    if(fonts):
+        font_registry.preload(list(fonts), font_sizes)
+    if(emoji):
+        store = get_emoji_store()
+        for size in font_sizes:
+            store.prefetch(emoji, size)
+    for template in templates:
+        if(isinstance(template, TemplateFactory)):
+            template = template.build()
+        for kwargs in (sample_kwargs or [{}]):
+            template.render(**kwargs)
+            renders += 1
+    gc.collect()
+    frozen = 0
+    if(freeze):
+        gc.freeze()
+        frozen = gc.get_freeze_count()
+    after = _rss()
+    return {"seconds": perf_counter()-start, "rss_bytes": after, "rss_growth": after-rss,
+            "renders": renders, "frozen_objects": frozen, "fonts": font_registry.stats(),
+            "images": image_cache.stats()}
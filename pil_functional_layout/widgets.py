@@ -1,16 +1,40 @@
-from PIL import Image, ImageFont, ImageDraw
+from PIL import Image, ImageDraw, ImageChops
 from math import ceil
+from functools import lru_cache
+from inspect import iscoroutinefunction, signature, Parameter
+from contextvars import copy_context
+from os import PathLike, cpu_count
 import time
 try:
     from .constants import *
     from . import resize
     from . import mylocale
-    from .get_emoji import _re as emoji_re, get_emoji
+    from .fontcache import get_font
+    from .imagecache import load_image
+    from .skins import BubbleSkin, PIECES as _PIECES
+    from .quality import get_quality
+    from .encoding import encode, encode_pool
+    from .buffers import buffer_image
+    from .layout import ImageNode, BoxNode
+    from . import memo
+    from . import masks
+    from . import asyncrender
+    from .get_emoji import _re as emoji_re, get_emoji_store, emoji_code, EmojiMissing
 except ImportError:
     from constants import *
     import resize
     import mylocale
-    from get_emoji import _re as emoji_re, get_emoji
+    from fontcache import get_font
+    from imagecache import load_image
+    from skins import BubbleSkin, PIECES as _PIECES
+    from quality import get_quality
+    from encoding import encode, encode_pool
+    from buffers import buffer_image
+    from layout import ImageNode, BoxNode
+    import memo
+    import masks
+    import asyncrender
+    from get_emoji import _re as emoji_re, get_emoji_store, emoji_code, EmojiMissing
 # const:
 # c_color_* for const colors
 
@@ -22,18 +46,126 @@ def none_or(*args):
     return None
 
 
+def _call(i, kwargs):
+    memo.record(i)
+    if(iscoroutinefunction(i)):
+        return asyncrender.resolve(i, kwargs)
+    return i(**kwargs)
+
+
 def solveCallable(i, **kwargs):
     while(callable(i)):
-        i = i(**kwargs)
+        i = _call(i, kwargs)
+    return i
+
+
+def _solve_content(i, **kwargs):
+    # widgets are callable too, don't let solveCallable render them
+    while(callable(i) and not isinstance(i, Widget)):
+        i = _call(i, kwargs)
     return i
 
 
 def _render_content(i, **kwargs):
-    i = solveCallable(i, **kwargs)
+    try:
+        i = _solve_content(i, **kwargs)
+        return _render_solved(i, kwargs)
+    except asyncrender.Pending:
+        # coroutine content not awaited yet, see asyncrender
+        memo.taint()
+        return Image.new("RGBA", (1, 1))
+
+
+def _render_through(i, **kwargs):
+    # for widgets returning their content's image as their own. _as_rgba passes an RGBA
+    # image given as content through, it's copied here so render() never returns the
+    # caller's image
+    try:
+        i = _solve_content(i, **kwargs)
+        ret = _render_solved(i, kwargs)
+    except asyncrender.Pending:
+        memo.taint()
+        return Image.new("RGBA", (1, 1))
+    if(ret is i):
+        ret = ret.copy()
+    return ret
+
+
+def _render_source(i, sizeHint, **kwargs):
+    # like _render_content, a file path or encoded image bytes is loaded through imagecache
+    # sizeHint: (width, height) the caller resamples it to at least, or None
+    try:
+        i = _solve_content(i, **kwargs)
+    except asyncrender.Pending:
+        memo.taint()
+        return Image.new("RGBA", (1, 1))
+    if(isinstance(i, (str, bytes, PathLike))):
+        return load_image(i, sizeHint)
+    return _render_content(i, **kwargs)
+
+
+def _as_rgba(i):
+    # RGBA images pass through uncopied, widgets never draw on their contents
+    if(i.mode == "RGBA"):
+        return i
+    ret = i.convert("RGBA")
+    if(not ({"A", "a"} & set(i.getbands()) or "transparency" in i.info)):
+        ret._opaque = True
+    return ret
+
+
+def _opaque(i):
+    # marked when known to be fully opaque, pasting it needs no mask
+    return getattr(i, "_opaque", False)
+
+
+def _paste(canvas, i, box):
+    if(_opaque(i)):
+        canvas.paste(i, box=box)
+    else:
+        canvas.paste(i, box=box, mask=i)
+
+
+@lru_cache(maxsize=256)
+def _takes_resize_args(func):
+    try:
+        params = signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+    if(any(i.kind == Parameter.VAR_KEYWORD for i in params.values())):
+        return True
+    return "resample" in params and "reducing_gap" in params
+
+
+def _resize_kwargs(func, quality):
+    # the profile's resample arguments, for resize callables taking them like the resize
+    # module's helpers. others are called without
+    try:
+        takes = _takes_resize_args(func)
+    except TypeError:   # unhashable
+        takes = False
+    return quality.resize_args() if takes else {}
+
+
+def _composite(size, bg, placed):
+    # placed: (image, (left, top)) pairs pasted over bg
+    # the result is opaque when bg and all the images are
+    bg = tuple(bg)
+    ret = Image.new("RGBA", size, bg)
+    opaque = len(bg) == 3 or bg[3] == 255
+    for i, box in placed:
+        _paste(ret, i, box)
+        opaque = opaque and _opaque(i)
+    if(opaque):
+        ret._opaque = True
+    return ret
+
+
+def _render_solved(i, kwargs):
     if(isinstance(i, Image.Image)):
-        return i.convert("RGBA")
+        return _as_rgba(i)
     elif(isinstance(i, Widget)):
-        return i.render(**kwargs)
+        return memo.render_widget(i, kwargs)
     elif(isinstance(i, list)):
         return [_render_content(j, **kwargs) for j in i]
     elif(i is None):
@@ -44,19 +176,165 @@ def _render_content(i, **kwargs):
                         i+" "+str(callable(i)))
 
 
+def _measure_content(i, **kwargs):
+    i = _solve_content(i, **kwargs)
+    if(isinstance(i, Image.Image)):
+        return ImageNode(_as_rgba(i))
+    elif(isinstance(i, Widget)):
+        return i.measure(**kwargs)
+    elif(isinstance(i, list)):
+        return [_measure_content(j, **kwargs) for j in i]
+    elif(i is None):
+        return None
+    else:
+        raise Exception("Unsupported widget content %s" %
+                        i+" "+str(callable(i)))
+
+
+_CPUS = cpu_count() or 1
+
+
+def _render_concurrently(executor, jobs):
+    # jobs are (content, kwargs). the calling thread renders the first one itself, the
+    # others are submitted. a job no worker has started yet when it's waited for is
+    # taken back and run here, so nested containers sharing one pool can't deadlock
+    cache = memo.active_cache()
+    futures = [executor.submit(copy_context().run, memo.run_detached, cache, _render_content, (i, ), kw)
+               for i, kw in jobs[1:]]
+    try:
+        i, kw = jobs[0]
+        results = [memo.run_detached(cache, _render_content, (i, ), kw)]
+        for (i, kw), future in zip(jobs[1:], futures):
+            if(future.cancel()):
+                results.append(memo.run_detached(
+                    cache, _render_content, (i, ), kw))
+            else:
+                results.append(future.result())
+    finally:
+        for future in futures:
+            future.cancel()
+    ret = []
+    for image, frame in results:
+        memo.merge(frame)
+        ret.append(image)
+    return ret
+
+
 class Widget:
+    # kwargs keys render() looks up itself, None if unknown (never memoized)
+    kwargsKeys = None
+    # concurrent.futures.Executor for rendering children, can also be passed as kwargs
+    executor = None
+    # the executor is only used from this many children on, and with several cpus.
+    # fanning out costs a context copy and a future per child, it pays off when children
+    # spend their time in Pillow code that releases the GIL, like resampling and
+    # compositing large images, on a multi core machine
+    parallelMinChildren = 4
+
+    def _passed_down(self, content):
+        # kwargs given to a single child, instead of setting attributes on it
+        return None
+
+    def _child_kwargs(self, content, kwargs):
+        updates = self._passed_down(content)
+        if(updates):
+            return dict(kwargs, **updates)
+        return kwargs
+
     def get_rendered_contents(self, **kwargs):
+        jobs = [(i, self._child_kwargs(i, kwargs)) for i in self.contents]
+        executor = self.executor or kwargs.get("executor")
+        if(executor is not None and _CPUS > 1 and len(jobs) >= self.parallelMinChildren):
+            return _render_concurrently(executor, jobs)
+        ret = list()
+        for i, kw in jobs:
+            ret.append(_render_content(i, **kw))
+        return ret
+
+    def get_measured_contents(self, **kwargs):
         ret = list()
         for i in self.contents:
-            ret.append(_render_content(i, **kwargs))
+            ret.append(_measure_content(i, **self._child_kwargs(i, kwargs)))
         return ret
+
+    def measure(self, **kwargs):
+        # layout pass, returns a node tree with sizes and child offsets.
+        # widgets that aren't containers are rasterized as a leaf.
+        return ImageNode(self.render(**kwargs))
+
+    def render_flat(self, **kwargs):
+        # same pixels as render(), but containers are painted straight into one canvas
+        return self.measure(**kwargs).render()
+
+    def compile(self, cache=None):
+        # flatten the tree into a reusable Plan, plan.render(**kwargs) == self.render(**kwargs)
+        # cache: a memo.RenderCache reusing leaves across renders, which is where the speedup
+        #     comes from. without one every leaf is evaluated on each render, see memo for
+        #     what callables have to declare to be cached
+        try:
+            from .plan import compile_widget
+        except ImportError:
+            from plan import compile_widget
+        return compile_widget(self, cache=cache)
+
+    def stream(self, **kwargs):
+        # Column and Grid: a streaming.StreamLayout for rendering regions or bands of it
+        # without the whole image, e.g. self.stream(**kwargs).save_png(pth)
+        try:
+            from .streaming import StreamLayout
+        except ImportError:
+            from streaming import StreamLayout
+        return StreamLayout(self, **kwargs)
+
+    def render_region(self, box, **kwargs):
+        # same as self.render(**kwargs).crop(box), Column and Grid only render what
+        # intersects box. keep self.stream(**kwargs) to render regions of it repeatedly
+        if(isinstance(self, (Column, Grid))):
+            return self.stream(**kwargs).region(box)
+        return self.render(**kwargs).crop(box)
+
+    def render_into(self, target, size=None, stride=None, offset=0, xy=(0, 0), blend=False, kwargs=None):
+        # paint into caller owned memory, see buffers.buffer_image for the targets
+        # the layout is painted at xy, clipped to the target, pixels outside of it are
+        # left alone. blend composites over what's already there instead of replacing it.
+        # kwargs: the template's kwargs, a dict so they can't clash with the options
+        # returns the layout's size
+        canvas = buffer_image(target, size, stride, offset)
+        node = self.measure(**(kwargs or {}))
+        node.paint(canvas, tuple(xy), blend=blend)
+        return node.size
+
+    def render_bytes(self, format="png", save_kwargs=None, encode_executor=None, kwargs=None):
+        # rendered and encoded, format is an encoding.presets name or a PIL format
+        # save_kwargs: override the preset's save options, see encoding.encode
+        # encode_executor: encode there and return a Future of the bytes instead, so the
+        #     next render can start meanwhile. True for a shared thread pool
+        # kwargs: the template's kwargs, as for render_into
+        im = self.render(**(kwargs or {}))
+        save_kwargs = save_kwargs or {}
+        if(encode_executor is None):
+            return encode(im, format, **save_kwargs)
+        if(encode_executor is True):
+            encode_executor = encode_pool()
+        return encode_executor.submit(encode, im, format, **save_kwargs)
+
+    async def render_async(self, offload=None, kwargs=None):
+        # coroutine function contents are awaited concurrently, see asyncrender
+        # offload: run the compositing on this executor instead of the event loop thread,
+        # True for the loop's default executor
+        # kwargs: the template's kwargs, as for render_into
+        return await asyncrender.render_async(self, offload, kwargs or {})
+
     def __call__(self, **kwargs):
         return self.render(**kwargs)
 
 
 class Grid(Widget):
-    def __init__(self, contents, borderWidth=None, outerBorder=None, rankdir=None, bg=None, alignX=None, alignY=None, autoAspectRatio=1):
+    kwargsKeys = ("borderWidth", "outerBorder", "rankdir")
+
+    def __init__(self, contents, borderWidth=None, outerBorder=None, rankdir=None, bg=None, alignX=None, alignY=None, autoAspectRatio=1, executor=None):
         self.contents = contents
+        self.executor = executor
         self.borderWidth = borderWidth
         self.outerBorder = outerBorder
         self.rankdir = rankdir
@@ -64,8 +342,7 @@ class Grid(Widget):
         self.alignX = alignX
         self.alignY = alignY
         self.autoAspectRatio = autoAspectRatio
-    def render(self, **kwargs):
-        contents = super().get_rendered_contents(**kwargs)
+    def _settings(self, kwargs):
         borderWidth = none_or(self.borderWidth, kwargs.get("borderWidth"))
         outerBorder = none_or(
             self.outerBorder, kwargs.get("outerBorder"), False)
@@ -73,6 +350,10 @@ class Grid(Widget):
         bg = self.bg or (0, )*4
         alignX = none_or(self.alignX, 0.5)
         alignY = none_or(self.alignY, 0.5)
+        return borderWidth, outerBorder, rankdir, bg, alignX, alignY
+
+    def _arrange(self, contents, borderWidth, outerBorder, rankdir, alignX, alignY):
+        # contents are anything with a size, returns canvas size and [(content, box)]
         if(isinstance(contents[0], list)):
             columns = len(contents)
             rows = len(contents[0])
@@ -117,7 +398,7 @@ class Grid(Widget):
             w, h = int(left), int(top)
         else:
             w, h = int(left-borderWidth), int(top-borderWidth)
-        ret = Image.new("RGBA", (w, h), bg)
+        placed = []
         for x in range(columns):
             for y in range(rows):
                 i = contents[x][y]
@@ -126,17 +407,38 @@ class Grid(Widget):
                 _w, _h = i.size
                 top = tops[y]+(row_heights[y]-_h)*alignY
                 left = lefts[x]+(column_widths[x]-_w)*alignX
-                ret.paste(i, box=(int(left), int(top)), mask=i)
-        return ret
+                placed.append((i, (int(left), int(top))))
+        return (w, h), placed
+
+    def render(self, **kwargs):
+        contents = super().get_rendered_contents(**kwargs)
+        borderWidth, outerBorder, rankdir, bg, alignX, alignY = self._settings(
+            kwargs)
+        size, placed = self._arrange(
+            contents, borderWidth, outerBorder, rankdir, alignX, alignY)
+        return _composite(size, bg, placed)
+
+    def measure(self, **kwargs):
+        contents = super().get_measured_contents(**kwargs)
+        borderWidth, outerBorder, rankdir, bg, alignX, alignY = self._settings(
+            kwargs)
+        size, placed = self._arrange(
+            contents, borderWidth, outerBorder, rankdir, alignX, alignY)
+        return BoxNode(size, bg, placed)
 
 
 class Row(Widget):
     # layouts a row of widgets
     # if row widget has specified height attribute, it will force its children column layout evenly by setting their height attribute.
     # if row widget has specified width attribute, it will layout children evenly. But won't inherit the attribute to children.
+    # executor: render children concurrently on a concurrent.futures executor
+    kwargsKeys = ("bg", "borderWidth", "borderColor",
+                  "alignY", "outer_border", "_inheritWidth", "quality")
+
     def __init__(self, contents, bg=None, borderWidth=None, borderColor=None,
-                 stretchHeight=None, expandHeight=None, cropHeight=None, alignY=None, height=None, width=None, stretchWH=None, outer_border=None):
+                 stretchHeight=None, expandHeight=None, cropHeight=None, alignY=None, height=None, width=None, stretchWH=None, outer_border=None, executor=None):
         self.contents = contents
+        self.executor = executor
         self.stretchHeight = stretchHeight
         self.expandHeight = expandHeight
         self.cropHeight = cropHeight
@@ -149,15 +451,17 @@ class Row(Widget):
         self.stretchWH = stretchWH
         self.outer_border = outer_border
 
-    def get_rendered_contents(self, **kwargs):
-        if(self.height):
-            for i in self.contents:
-                if(isinstance(i, Column)):
-                    if(i.height is None):
-                        i.height = self.height
-        return super().get_rendered_contents(**kwargs)
+    def _passed_down(self, content):
+        # the height goes to Column children through kwargs, the tree is never modified
+        # while rendering so it can be rendered from several threads
+        if(self.height and isinstance(content, Column) and content.height is None):
+            return {"_inheritHeight": self.height}
+        if((self.stretchWH or self.stretchHeight) and isinstance(content, SizeBox)):
+            # leave the SizeBox's resize pending, it's fused with this one
+            return {"_lazyResize": True}
+        return None
 
-    def render(self, **kwargs):
+    def _settings(self, kwargs):
         # **kwargs are inherited attributes like bg color from parznt downwards to children when render
 
         bg = self.bg or kwargs.get('bg') or c_color_TRANSPARENT
@@ -167,62 +471,91 @@ class Row(Widget):
         alignY = none_or(self.alignY, kwargs.get('alignY'), 0.5)
         outer_border = none_or(
             self.outer_border, kwargs.get("outer_border"), False)
+        width = none_or(self.width, kwargs.pop("_inheritWidth", None))
         kwargs['bg'] = bg  # inherit settings
         kwargs['borderWidth'] = borderWidth
         kwargs['borderColor'] = borderColor
         # kwargs['alignY']=alignY
+        return bg, borderWidth, alignY, outer_border, width
 
-        r_contents = self.get_rendered_contents(**kwargs)
+    def _resizes(self):
+        return self.stretchWH or self.stretchHeight or self.expandHeight
+
+    def _resize_contents(self, r_contents, quality):
         if(self.stretchWH):
             for idx, i in enumerate(r_contents):
-                i = i.resize(self.stretchWH, Image.LANCZOS)
+                i = quality.resize(i, self.stretchWH)
                 r_contents[idx] = i
         if(self.stretchHeight):
             for idx, i in enumerate(r_contents):
-                i = resize.stretchHeight(i, self.stretchHeight)
+                i = resize.stretchHeight(
+                    i, self.stretchHeight, **quality.resize_args())
                 r_contents[idx] = i
         elif(self.expandHeight):
             for idx, i in enumerate(r_contents):
                 i = resize.expandHeight(i, self.expandHeight)
                 r_contents[idx] = i
+        return [resize.materialize(i) for i in r_contents]
+
+    def _arrange(self, sizes, borderWidth, alignY, outer_border, width=None):
+        # returns canvas size and the box of each child
         mxHeight = 0
         sWidth = 0
-        for i in r_contents:
-            w, h = i.size
+        for w, h in sizes:
             mxHeight = max(h, mxHeight)
             sWidth += w
-        if(self.width):
-            width = self.width
+        if(width):
             if(outer_border):
-                borderWidthX = (width-sWidth)/(1+len(r_contents))
+                borderWidthX = (width-sWidth)/(1+len(sizes))
             else:
-                if(len(r_contents) != 1):
-                    borderWidthX = (width-sWidth)/(len(r_contents)-1)
+                if(len(sizes) != 1):
+                    borderWidthX = (width-sWidth)/(len(sizes)-1)
                 else:
                     borderWidthX = 0  # meaningless
         else:
             borderWidthX = borderWidth
             if(outer_border):
-                width = sWidth+borderWidthX*(1+len(r_contents))
+                width = sWidth+borderWidthX*(1+len(sizes))
             else:
-                width = sWidth+borderWidthX*(len(r_contents)-1)
+                width = sWidth+borderWidthX*(len(sizes)-1)
 
         height = mxHeight+(borderWidth if outer_border else 0)*2
 
-        ret = Image.new("RGBA", (width, height), tuple(bg))
+        boxes = []
         left = (borderWidthX if outer_border else 0)
-        for idx, i in enumerate(r_contents):
-            w, h = i.size
+        for w, h in sizes:
             top = int((borderWidth if outer_border else 0)+(mxHeight-h)*alignY)
-            ret.paste(i, box=(int(left), top), mask=i)
+            boxes.append((int(left), top))
             left += w+borderWidthX
-        return ret
+        return (width, height), boxes
+
+    def render(self, **kwargs):
+        bg, borderWidth, alignY, outer_border, width = self._settings(kwargs)
+        r_contents = self.get_rendered_contents(**kwargs)
+        r_contents = self._resize_contents(r_contents, get_quality(kwargs))
+        size, boxes = self._arrange(
+            [i.size for i in r_contents], borderWidth, alignY, outer_border, width)
+        return _composite(size, bg, zip(r_contents, boxes))
+
+    def measure(self, **kwargs):
+        bg, borderWidth, alignY, outer_border, width = self._settings(kwargs)
+        nodes = self.get_measured_contents(**kwargs)
+        if(self._resizes()):
+            nodes = [ImageNode(i) for i in self._resize_contents(
+                [i.render() for i in nodes], get_quality(kwargs))]
+        size, boxes = self._arrange(
+            [i.size for i in nodes], borderWidth, alignY, outer_border, width)
+        return BoxNode(size, bg, list(zip(nodes, boxes)))
 
 
 class Column(Widget):
+    kwargsKeys = ("bg", "borderWidth", "borderColor",
+                  "alignX", "outer_border", "_inheritHeight", "quality")
+
     def __init__(self, contents, bg=None, borderWidth=None, borderColor=None,
-                 stretchWidth=None, expandWidth=None, cropWidth=None, alignX=None, height=None, width=None, stretchWH=None, outer_border=False):
+                 stretchWidth=None, expandWidth=None, cropWidth=None, alignX=None, height=None, width=None, stretchWH=None, outer_border=False, executor=None):
         self.contents = contents
+        self.executor = executor
         self.stretchWidth = stretchWidth
         self.stretchWH = stretchWH
         self.expandWidth = expandWidth
@@ -235,15 +568,14 @@ class Column(Widget):
         self.width = width
         self.outer_border = outer_border
 
-    def get_rendered_contents(self, **kwargs):
-        if(self.width):
-            for i in self.contents:
-                if(isinstance(i, Row)):
-                    if(i.width is None):
-                        i.width = self.width
-        return super().get_rendered_contents(**kwargs)
+    def _passed_down(self, content):
+        if(self.width and isinstance(content, Row) and content.width is None):
+            return {"_inheritWidth": self.width}
+        if((self.stretchWH or self.stretchWidth) and isinstance(content, SizeBox)):
+            return {"_lazyResize": True}
+        return None
 
-    def render(self, **kwargs):
+    def _settings(self, kwargs):
         # **kwargs are inherited attributes like bg color from parent downwards to children when render
         bg = self.bg or kwargs.get('bg') or c_color_TRANSPARENT
         borderWidth = self.borderWidth or kwargs.get('borderWidth') or 0
@@ -252,59 +584,87 @@ class Column(Widget):
             self.outer_border, kwargs.get("outer_border"), False)
         #alignX=self.alignX or kwargs.get('alignX') or 0.5
         alignX = none_or(self.alignX, kwargs.get('alignX'), 0.5)
+        height = none_or(self.height, kwargs.pop("_inheritHeight", None))
 
         kwargs['bg'] = bg  # inherit settings
         kwargs['borderWidth'] = borderWidth
         kwargs['borderColor'] = borderColor
         kwargs['alignX'] = alignX
+        return bg, borderWidth, alignX, outer_border, height
 
-        r_contents = self.get_rendered_contents(**kwargs)
+    def _resizes(self):
+        return self.stretchWH or self.stretchWidth or self.expandWidth
+
+    def _resize_contents(self, r_contents, quality):
         if(self.stretchWH):
             for idx, i in enumerate(r_contents):
-                i = i.resize(self.stretchWH, Image.LANCZOS)
+                i = quality.resize(i, self.stretchWH)
                 r_contents[idx] = i
         if(self.stretchWidth):
             for idx, i in enumerate(r_contents):
-                i = resize.stretchWidth(i, self.stretchWidth)
+                i = resize.stretchWidth(
+                    i, self.stretchWidth, **quality.resize_args())
                 r_contents[idx] = i
         elif(self.expandWidth):
             for idx, i in enumerate(r_contents):
                 i = resize.expandWidth(i, self.expandWidth)
                 r_contents[idx] = i
+        return [resize.materialize(i) for i in r_contents]
+
+    def _arrange(self, sizes, borderWidth, alignX, outer_border, height=None):
+        # returns canvas size and the box of each child
         mxWidth = 0
         sHeight = 0
-        for i in r_contents:
-            w, h = i.size
+        for w, h in sizes:
             mxWidth = max(mxWidth, w)
             sHeight += h
-        if(self.height):
-            height = self.height
+        if(height):
             if(outer_border):
-                borderWidthY = (height-sHeight)/(len(r_contents)+1)
+                borderWidthY = (height-sHeight)/(len(sizes)+1)
             else:
-                if(len(r_contents) != 1):
-                    borderWidthY = (height-sHeight)/(len(r_contents)-1)
+                if(len(sizes) != 1):
+                    borderWidthY = (height-sHeight)/(len(sizes)-1)
                 else:
                     borderWidthY = 0
         else:
             borderWidthY = borderWidth
             if(outer_border):
-                height = sHeight+borderWidthY*(1+len(r_contents))
+                height = sHeight+borderWidthY*(1+len(sizes))
             else:
-                height = sHeight+borderWidthY*(len(r_contents)-1)
+                height = sHeight+borderWidthY*(len(sizes)-1)
         width = mxWidth+2*(borderWidth if outer_border else 0)
 
-        ret = Image.new("RGBA", (width, height), tuple(bg))
+        boxes = []
         top = borderWidthY if outer_border else 0
-        for idx, i in enumerate(r_contents):
-            w, h = i.size
+        for w, h in sizes:
             left = int((borderWidth if outer_border else 0)+(mxWidth-w)*alignX)
-            ret.paste(i, box=(int(left), int(top)), mask=i)
+            boxes.append((int(left), int(top)))
             top += h + borderWidthY
-        return ret
+        return (width, height), boxes
+
+    def render(self, **kwargs):
+        bg, borderWidth, alignX, outer_border, height = self._settings(kwargs)
+        r_contents = self.get_rendered_contents(**kwargs)
+        r_contents = self._resize_contents(r_contents, get_quality(kwargs))
+        size, boxes = self._arrange(
+            [i.size for i in r_contents], borderWidth, alignX, outer_border, height)
+        return _composite(size, bg, zip(r_contents, boxes))
+
+    def measure(self, **kwargs):
+        bg, borderWidth, alignX, outer_border, height = self._settings(kwargs)
+        nodes = self.get_measured_contents(**kwargs)
+        if(self._resizes()):
+            nodes = [ImageNode(i) for i in self._resize_contents(
+                [i.render() for i in nodes], get_quality(kwargs))]
+        size, boxes = self._arrange(
+            [i.size for i in nodes], borderWidth, alignX, outer_border, height)
+        return BoxNode(size, bg, list(zip(nodes, boxes)))
 
 
 class SizeBox(Widget):
+    # under a stretching Row or Column, returns a resize.Resized the parent materializes
+    kwargsKeys = ("bg", "quality", "_lazyResize")
+
     def __init__(self, content, stretchWH=None, stretchWidth=None, stretchHeight=None, expandHeight=None, expandWidth=None, cropWH=None):
         self.content = content
         self.stretchWidth = stretchWidth
@@ -314,19 +674,36 @@ class SizeBox(Widget):
         self.stretchWH = stretchWH
         self.cropWH = cropWH
 
+    def _size_hint(self):
+        if(self.cropWH):
+            return self.cropWH
+        if(self.stretchWH):
+            return self.stretchWH
+        if(self.stretchWidth):
+            return (self.stretchWidth, None)
+        if(self.stretchHeight):
+            return (None, self.stretchHeight)
+        return None
+
     def render(self, **kwargs):
-        ret = _render_content(self.content, **kwargs)
+        lazy = kwargs.pop("_lazyResize", False)
+        ret = _render_source(self.content, self._size_hint(), **kwargs)
+        quality = get_quality(kwargs)
+        if(lazy and isinstance(ret, Image.Image)):
+            ret = resize.Resized(ret)
         if(self.cropWH):
-            ret = resize.cropWH(ret, self.cropWH)
+            ret = resize.cropWH(ret, self.cropWH, **quality.resize_args())
             return ret
         if(self.stretchWH):
-            ret = ret.resize(self.stretchWH, Image.LANCZOS)
+            ret = quality.resize(ret, self.stretchWH)
             return ret
         if(self.stretchWidth):
-            ret = resize.stretchWidth(ret, self.stretchWidth)
+            ret = resize.stretchWidth(
+                ret, self.stretchWidth, **quality.resize_args())
             return ret
         if(self.stretchHeight):
-            ret = resize.stretchHeight(ret, self.stretchHeight)
+            ret = resize.stretchHeight(
+                ret, self.stretchHeight, **quality.resize_args())
             return ret
         if(self.expandHeight):
             if(isinstance(self.expandHeight, tuple)):
@@ -362,6 +739,8 @@ class SizeBox(Widget):
 
 class SetFont(Widget):
     # used to pass font attribute down to children widgets
+    kwargsKeys = ("font", "fontSize", "lang")
+
     def __init__(self, content, font=None, fontSize=None, lang=None):
         self.font = font
         self.fontSize = fontSize
@@ -372,24 +751,141 @@ class SetFont(Widget):
         kwargs['font'] = self.font or kwargs.get('font')
         kwargs['fontSize'] = self.fontSize or kwargs.get('fontSize')
         kwargs['lang'] = self.lang or kwargs.get('lang')
-        return self.content.render(**kwargs)
+        return _render_through(self.content, **kwargs)
+
+    def measure(self, **kwargs):
+        kwargs['font'] = self.font or kwargs.get('font')
+        kwargs['fontSize'] = self.fontSize or kwargs.get('fontSize')
+        kwargs['lang'] = self.lang or kwargs.get('lang')
+        return self.content.measure(**kwargs)
 
 
 class SetKwargs(Widget):
+    kwargsKeys = ()
+
     def __init__(self, content, **kwargs):
         self.content = content
         self.kwargs = kwargs
 
     def render(self, **kwargs):
         kwargs.update(self.kwargs)
-        return _render_content(self.content, **kwargs)
+        return _render_through(self.content, **kwargs)
+
+    def measure(self, **kwargs):
+        kwargs.update(self.kwargs)
+        return _measure_content(self.content, **kwargs)
 
 
 class _lineFeed:
     pass
 
 
+def _break_rows(contents, fnt, width, horizontalSpacing, slack=None):
+    # greedy line breaking over str / Image / _lineFeed tokens
+    # row width is horizontalSpacing plus (segment width + horizontalSpacing) per segment,
+    # where a segment is an image or a run of consecutive strings measured as a whole.
+    # each token's advance is measured once and summed as an estimate, the exact
+    # run width is only asked from the font when the estimate is within slack of the limit.
+    if(slack is None):
+        slack = fnt.size
+    lengths = dict()
+
+    def length(s):
+        ret = lengths.get(s)
+        if(ret is None):
+            ret = lengths[s] = fnt.getlength(s)
+        return ret
+
+    def run_width(run):
+        s = "".join(run)
+        if(not s):
+            return 0
+        return fnt.getsize(s)[0]+horizontalSpacing
+
+    rows = list()
+    _row = list()
+    fixed = horizontalSpacing   # closed segments
+    run = list()                # open run of strings
+    run_est = 0
+    run_exact = 0
+
+    def close_run():
+        nonlocal fixed, run, run_est, run_exact
+        if(run):
+            if(run_exact is None):
+                run_exact = run_width(run)
+            fixed += run_exact
+        run = list()
+        run_est = 0
+        run_exact = 0
+
+    def start_row(i):
+        nonlocal _row, fixed, run, run_est, run_exact
+        _row = [i]
+        fixed = horizontalSpacing
+        run = list()
+        run_est = 0
+        run_exact = 0
+        if(isinstance(i, str)):
+            run = [i]
+            run_est = length(i)
+            run_exact = None
+        else:
+            fixed += i.size[0]+horizontalSpacing
+
+    for i in contents:
+        if(isinstance(i, _lineFeed)):
+            rows.append(_row+[i])
+            _row = list()
+            fixed = horizontalSpacing
+            run = list()
+            run_est = 0
+            run_exact = 0
+            continue
+        if(isinstance(i, str)):
+            est = run_est+length(i)
+            if(fixed+est+horizontalSpacing > width+slack):
+                exceeds = True
+                exact = None
+            elif(fixed+est+horizontalSpacing < width-slack):
+                exceeds = False
+                exact = None
+            else:
+                exact = run_width(run+[i])
+                exceeds = fixed+exact > width
+            if(exceeds):
+                rows.append(_row+[_lineFeed()])
+                start_row(i)
+            else:
+                _row.append(i)
+                run.append(i)
+                run_est = est
+                run_exact = exact
+        else:
+            w = i.size[0]+horizontalSpacing
+            if(run and run_exact is None):
+                if(fixed+run_est+horizontalSpacing+w > width+slack):
+                    exceeds = True
+                else:
+                    run_exact = run_width(run)
+                    exceeds = fixed+run_exact+w > width
+            else:
+                exceeds = fixed+run_exact+w > width
+            if(exceeds):
+                rows.append(_row+[_lineFeed()])
+                start_row(i)
+            else:
+                close_run()
+                _row.append(i)
+                fixed += w
+    rows.append(_row+[_lineFeed()])
+    return rows
+
+
 class RichText(Widget):
+    kwargsKeys = ("font", "fontSize", "bg", "fill", "width", "quality",
+                  "alignX", "alignY", "imageLimit", "horizontalSpacing", "emojiStore")
+
     def __init__(self, contents, width, font=None, fontSize=None, bg=None, lang=None, fill=None, alignY=None, alignX=None, dontSplit=False, imageLimit=None, horizontalSpacing=None, autoSplit=True):
         self.width = width
         self.alignX = alignX
@@ -419,8 +915,10 @@ class RichText(Widget):
             'imageLimit') or (width/c_golden_ratio, fontSize*4)
         horizontalSpacing = self.horizontalSpacing or kwargs.get(
             'horizontalSpacing') or int(fontSize/c_golden_ratio)
+        emojiStore = kwargs.get('emojiStore') or get_emoji_store()
+        quality = get_quality(kwargs)
 
-        fnt = ImageFont.truetype(font, fontSize)
+        fnt = get_font(font, fontSize)
 
         def render_text(text):
             if(not text):
@@ -428,6 +926,7 @@ class RichText(Widget):
             size = fnt.getsize(text)
             ret = Image.new("RGBA", size, tuple(c_color_TRANSPARENT))
             dr = ImageDraw.Draw(ret)
+            dr.fontmode = quality.fontmode
             dr.text((0, 0), text, font=fnt, fill=tuple(fill))
             return ret
 
@@ -458,28 +957,10 @@ class RichText(Widget):
             for i in _text_rendered:
                 w, h = i.size
                 upper = int((height-h)*alignY)
-                ret.paste(i, box=(left, upper), mask=i)
+                _paste(ret, i, (left, upper))
                 left += w+horizontalSpacing
             return ret
 
-        def calc_row_width(_row):
-            nonlocal fnt
-            if(not _row):
-                return 0
-            now_str = ""
-            ret = horizontalSpacing
-            for i in _row:
-                if(isinstance(i, str)):
-                    now_str += i
-                elif(isinstance(i, Image.Image) or isinstance(i, _lineFeed)):
-                    if(now_str):
-                        # _text_rendered.append(render_text(now_str))
-                        ret += fnt.getsize(now_str)[0]+horizontalSpacing
-                        now_str = ''
-                    if(isinstance(i, Image.Image)):
-                        ret += i.size[0]+horizontalSpacing
-            return ret
-
         __contents = solveCallable(self.contents, **kwargs)
         if(self.autoSplit):
             ___contents = list()
@@ -489,7 +970,7 @@ class RichText(Widget):
                 else:
                     ___contents.append(i)
             __contents = ___contents
-        _contents = list()
+        resolved = list()
         for i in __contents:
             try:
                 content = _render_content(i, **kwargs)
@@ -498,6 +979,18 @@ class RichText(Widget):
                     content = solveCallable(i, **kwargs)  # is string
                 else:
                     raise e
+            resolved.append(content)
+        if(not self.dontSplit):
+            # resolve all emojis concurrently before layout
+            codes = set()
+            for content in resolved:
+                if(isinstance(content, str)):
+                    codes.update(emoji_code(j)
+                                 for j in emoji_re.findall(content))
+            if(codes):
+                emojiStore.prefetch(codes, fontSize, quality=quality)
+        _contents = list()
+        for content in resolved:
             if(isinstance(content, str)):
                 if(self.dontSplit):
                     for jdx, j in enumerate(content.split('\n')):
@@ -511,35 +1004,27 @@ class RichText(Widget):
                         else:
                             if(emoji_re.match(j)):
                                 try:
-                                    code = hex(ord(j)).upper()[2:]
-                                    print("emoji", code)
-                                    im = get_emoji(code).convert("RGBA")
-                                    im = resize.stretchHeight(im, fontSize)
+                                    # prefetched above, one still being fetched past
+                                    # the deadline is drawn as text
+                                    im = emojiStore.get(
+                                        emoji_code(j), fontSize, timeout=0, quality=quality)
                                     _contents.append(im)
+                                except EmojiMissing:
+                                    _contents.append(j)
                                 except Exception:
+                                    # a placeholder, the emoji may be there next time
+                                    memo.taint()
                                     _contents.append(j)
                             else:
                                 _contents.append(j)
             elif(isinstance(content, Image.Image)):
                 '''if(content.width>width):
                     content=resize.stretchWidth(content,width)'''
-                content = resize.stretchIfExceeds(content, imageLimit)
+                content = resize.stretchIfExceeds(
+                    content, imageLimit, **quality.resize_args())
                 _contents.append(content)
 
-        rows = list()
-        _row = [_lineFeed()]
-
-        for i in _contents:
-            if(isinstance(i, _lineFeed)):
-                rows.append(_row)
-                _row = [_lineFeed()]
-                continue
-            _row.insert(-1, i)
-            if(calc_row_width(_row) > width):
-                _row.pop(-2)
-                rows.append(_row)
-                _row = [i, _lineFeed()]
-        rows.append(_row)
+        rows = _break_rows(_contents, fnt, width, horizontalSpacing)
 
         rows = [render_row(_row) for _row in rows]
 
@@ -554,13 +1039,15 @@ class RichText(Widget):
         for i in rows:
             w, h = i.size
             left = int((width-w)*alignX)
-            ret.paste(i, box=(left, top), mask=i)
+            _paste(ret, i, (left, top))
             top += h
 
         return ret
 
 
 class Pill(Widget):
+    kwargsKeys = ("quality", )
+
     def __init__(self, contentA, contentB, height=None, colorBorder=None, colorA=None, colorB=None, borderWidth=None, borderInner=None, alignY=1):
         self.contentA = contentA
         self.contentB = contentB
@@ -587,19 +1074,15 @@ class Pill(Widget):
         w, h = contentA.size[0]+contentB.size[0], height
         w, h = w+bw*2+height, height+bw*2
         w, h = w+bi*2, h+bi*2
-        ret = Image.new("RGBA", (w, h), (0, )*4)
-        dr = ImageDraw.Draw(ret)
-
-        dr.pieslice((0, 0, h, h), 90, 270, tuple(colorBorder))
-        dr.pieslice((bw, bw, h-bw, h-bw), 90, 270, tuple(colorA))
-        dr.pieslice((w-h, 0, w, h), -90, 90, tuple(colorBorder))
-        dr.pieslice((w-h+bw, bw, w-bw, h-bw), -90, 90, tuple(colorB))
-
-        dr.rectangle((h/2, 0, w-h/2, h), fill=tuple(colorBorder))
-        dr.rectangle(
-            (h/2, bw, h/2+contentA.size[0]+bi, h-bw), fill=tuple(colorA))
-        dr.rectangle((h/2+contentA.size[0]+bi,
-                     bw, w-h/2, h-bw), fill=tuple(colorB))
+        supersample = get_quality(kwargs).supersample
+        ret = masks.filled(masks.rounded_rect(
+            (w, h), h/2, supersample), colorBorder)
+        inner = masks.rounded_rect((w-bw*2, h-bw*2), h/2-bw, supersample)
+        split = int(h/2+contentA.size[0]+bi)
+        ret.alpha_composite(masks.filled(
+            inner.crop((0, 0, split-bw, inner.height)), colorA), dest=(bw, bw))
+        ret.alpha_composite(masks.filled(inner.crop(
+            (split-bw, 0, inner.width, inner.height)), colorB), dest=(split, bw))
 
         top = bw+bi+int((height-contentA.size[1])*self.alignY)
         ret.paste(contentA, (h//2, top), mask=contentA)
@@ -610,6 +1093,8 @@ class Pill(Widget):
 
 class Text(Widget):
     # content should be str or callable object that returns str
+    kwargsKeys = ("font", "fontSize", "bg", "fill", "quality")
+
     def __init__(self, content, font=None, fontSize=None, bg=None, lang=None, fill=None):
         self.font = font
         self.fontSize = fontSize
@@ -628,18 +1113,21 @@ class Text(Widget):
 
         content = solveCallable(self.content, **kwargs)
 
-        fnt = ImageFont.truetype(font, fontSize)
+        fnt = get_font(font, fontSize)
         size = fnt.getsize(content)
         ret = Image.new("RGBA", size, tuple(bg))
         dr = ImageDraw.Draw(ret)
+        dr.fontmode = get_quality(kwargs).fontmode
         dr.text((0, 0), content, font=fnt, fill=tuple(fill))
         return ret
 
 
 class AvatarCircle(Widget):
+    kwargsKeys = ("bg", "quality")
+
     def __init__(self, content, size=None, bg=None):
         """
-            content: Image, Widget, or Callable(kwargs)
+            content: Image, file path, Widget, or Callable(kwargs)
             size: Avatar size, w=h=size
             bg: Color
         """
@@ -652,42 +1140,46 @@ class AvatarCircle(Widget):
 
         kwargs['bg'] = bg
 
-        content = _render_content(self.content, **kwargs)
+        hint = None if self.size is None else (self.size, self.size)
+        content = _render_source(self.content, hint, **kwargs)
         if(self.size is None):
             size = min(content.size)
         else:
             size = self.size
-        mask = Image.new("L", (size, size), 0)
-        dr = ImageDraw.Draw(mask)
-        dr.ellipse((0, 0, size, size), fill=255)
-
-        content = resize.cropWH(content, (size, size))
+        quality = get_quality(kwargs)
+        content = resize.cropWH(content, (size, size), **quality.resize_args())
         ret = Image.new("RGBA", (size, size), tuple(bg))
-        ret.paste(content, mask=mask)
+        ret.alpha_composite(masks.shaped(
+            content, masks.circle(size, quality.supersample)))
         return ret
 
 
 class CompositeBG(Widget):
+    kwargsKeys = ("bg", "quality")
+
     def __init__(self, content, bg=None):
         self.content = content
         self.bg = bg
 
     def render(self, **kwargs):
-        content = _render_content(self.content, **kwargs)
+        content = _render_source(self.content, None, **kwargs)
         # BG=_render_content(self.BG).copy()
         bg = solveCallable(none_or(solveCallable(
             self.bg, **kwargs), kwargs.get("bg"), c_color_WHITE), **kwargs)
         if(isinstance(bg, color)):
             bg = Image.new("RGBA", content.size, tuple(bg))
         else:
-            bg = _render_content(bg, **kwargs).copy()
-        bg = resize.cropWH(bg, content.size)
+            bg = _render_source(bg, content.size, **kwargs).copy()
+        bg = resize.cropWH(bg, content.size, **
+                           get_quality(kwargs).resize_args())
         # bg.paste(content, mask=content)
         bg.alpha_composite(content)
         return bg
 
 
 class colorBox(Widget):
+    kwargsKeys = ()
+
     def __init__(self, bg, width, height=None):
         self.bg = bg
         self.width = width
@@ -698,6 +1190,8 @@ class colorBox(Widget):
 
 
 class gradientBox(Widget):
+    kwargsKeys = ("grad_width", "grad_height")
+
     def __init__(self, width=None, height=None, lu=None, ru=None, ll=None, rl=None):
         self.lu = lu
         self.ru = ru
@@ -719,73 +1213,96 @@ class gradientBox(Widget):
         height = self.height or kwargs.get('grad_height') or 512
 
         type = self.judge_type()
-
-        ret = Image.new("RGBA", (width, height))
-
-        def get(x, y):
-            x_norm = x/width
-            y_norm = y/height
-            if(type == 0b1010):  # lu set and ll set, verticle
-                return self.ll*y_norm+self.lu*(1-y_norm)
-            elif(type == 0b1100):  # lu set and ru set, horizontal
-                return self.ru*x_norm+self.ru*(1-x_norm)
-            elif(type == 0b1001):  # lu set and rl set, ////
-                x_ = (x_norm+y_norm)/2
-                return self.lu*(1-x_)+self.rl*x_
-            elif(type == 0b0110):  # ll set and ru set, \\\\
-                x_ = (x_norm+1-y_norm)/2
-                return self.ll*(1-x_)+self.ru*x_
-            else:
-                _ = ['lu', 'ru', 'll', 'rl'][::-1]
-                __ = []
-                for i in range(4):
-                    if(type & (1 << i)):
-                        __.append(_[i])
-                raise Exception("Unsupported gradient(%s)" % (",".join(__)))
-        for x in range(width):
-            for y in range(height):
-                ret.putpixel((x, y), tuple(get(x, y)))
-        del get
-        return ret
+        if(type not in (0b0101, 0b0011, 0b1001, 0b0110)):
+            _ = ['lu', 'ru', 'll', 'rl']
+            __ = []
+            for i in range(4):
+                if(type & (1 << i)):
+                    __.append(_[i])
+            raise Exception("Unsupported gradient(%s)" % (",".join(__)))
+        corners = tuple(None if i is None else tuple(color.fromany(i))
+                        for i in (self.lu, self.ru, self.ll, self.rl))
+        # cached images are shared
+        return _gradient((width, height), type, *corners).copy()
+
+
+def _ramp(length):
+    # 1 pixel wide L strip going from 0 to 255*(length-1)/length
+    ret = Image.new("L", (length, 1))
+    ret.putdata([int(255*i/length+0.5) for i in range(length)])
+    return ret
+
+
+@lru_cache(maxsize=32)
+def _gradient(size, type, lu, ru, ll, rl):
+    # blends between the two given corners with an L mask
+    width, height = size
+    mx = _ramp(width).resize(size, Image.NEAREST)
+    my = _ramp(height).transpose(Image.TRANSPOSE).resize(size, Image.NEAREST)
+    if(type == 0b0101):  # lu set and ll set, verticle
+        a, b, mask = lu, ll, my
+    elif(type == 0b0011):  # lu set and ru set, horizontal
+        a, b, mask = lu, ru, mx
+    elif(type == 0b1001):  # lu set and rl set, ////
+        a, b, mask = lu, rl, ImageChops.add(mx, my, scale=2)
+    else:  # ll set and ru set, \\\\
+        a, b, mask = ll, ru, ImageChops.add(mx, ImageChops.invert(my), scale=2)
+    return Image.composite(Image.new("RGBA", size, b), Image.new("RGBA", size, a), mask)
 
 
 class AddBorder(Widget):
+    kwargsKeys = ("borderWidth", "bg", "borderColor")
+
     def __init__(self, content, borderWidth=None, borderColor=None):
         self.content = content
         self.borderWidth = borderWidth
         self.borderColor = borderColor
 
-    def render(self, **kwargs):
-        content = _render_content(self.content, **kwargs)
+    def _settings(self, size, kwargs):
         borderWidth = none_or(self.borderWidth, kwargs.get("borderWidth"))
         invertBG = None if(kwargs.get("bg") is None) else color.fromany(
             kwargs.get("bg")).invert()
         borderColor = none_or(self.borderColor, kwargs.get(
             "borderColor"), invertBG, c_color_TRANSPARENT)
-        w, h = content.size
+        w, h = size
         if(borderWidth is None):
             borderWidth = (w*h)**0.5
             borderWidth = int(borderWidth/20)
         width, height = w+borderWidth*2, h+borderWidth*2
-        ret = Image.new("RGBA", (width, height), tuple(borderColor))
+        return borderWidth, borderColor, (width, height)
+
+    def render(self, **kwargs):
+        content = _render_content(self.content, **kwargs)
+        borderWidth, borderColor, size = self._settings(content.size, kwargs)
+        ret = Image.new("RGBA", size, tuple(borderColor))
         ret.paste(content, box=(borderWidth, borderWidth))
         return ret
 
+    def measure(self, **kwargs):
+        content = _measure_content(self.content, **kwargs)
+        borderWidth, borderColor, size = self._settings(content.size, kwargs)
+        return BoxNode(size, borderColor, [(content, (borderWidth, borderWidth))], blend=False)
+
 
 addBorder = AddBorder
 
 
 class bubble(Widget):
+    kwargsKeys = ("lu", "up", "ru", "le", "mi",
+                  "ri", "ll", "lo", "rl", "border_size", "mid_border_size", "skin", "quality")
+
     def __init__(self, content, kwa):
+        # kwa: the nine pieces or a skins.BubbleSkin as 'skin', border_size, mid_border_size
         self.content = content
         self.kwa = kwa
+        self.skin = kwa.get('skin')
+        if(self.skin is None and kwa.get('lu') is not None):
+            self.skin = BubbleSkin(
+                **{i: kwa[i] for i in _PIECES if kwa.get(i) is not None})
 
     def from_dir(content, pth, **kwa):
         # left-upper upper right-upper left middle right left-lower lower right-lower
-        from os import path
-        for i in ['lu', 'up', 'ru', 'le', 'mi', 'ri', 'll', 'lo', 'rl']:
-            if(path.exists(path.join(pth, i+'.png'))):
-                kwa[i] = Image.open(path.join(pth, i+'.png'))
+        kwa['skin'] = BubbleSkin.from_dir(pth)
         return bubble(content, kwa)
 
     def default(content, **kwa):
@@ -800,15 +1317,10 @@ class bubble(Widget):
         kwa.update(self.kwa)
         kwa.update(**kwargs)
         img = _render_content(self.content, **kwargs)
-        lu = kwa.get('lu')
-        up = kwa.get('up')
-        ru = kwa.get('ru')
-        le = kwa.get('le')
-        mi = kwa.get('mi')
-        ri = kwa.get('ri')
-        ll = kwa.get('ll')
-        lo = kwa.get('lo')
-        rl = kwa.get('rl')
+        skin = kwargs.get('skin') or self.skin
+        pieces = {i: kwargs[i] for i in _PIECES if kwargs.get(i) is not None}
+        if(pieces):
+            skin = skin.replace(**pieces) if skin else BubbleSkin(**pieces)
         border_size = kwa.get('border_size')
         mid_border_size = kwa.get('mid_border_size')
         if(border_size is None):
@@ -818,43 +1330,15 @@ class bubble(Widget):
         _, __ = img.size
         _ -= 2*(border_size-mid_border_size)
         __ -= 2*(border_size-mid_border_size)
-        bs = border_size
-        w, h = _+border_size*2, __+border_size*2
-        ret = Image.new("RGBA", (w, h))
-        ret1 = Image.new("RGBA", (w, h))
-        if(ru is None):
-            ru = lu.transpose(Image.FLIP_LEFT_RIGHT)
-        if(ri is None):
-            ri = le.transpose(Image.FLIP_LEFT_RIGHT)
-        if(rl is None):
-            rl = lu.transpose(Image.ROTATE_180)
-        if(lo is None):
-            lo = up.transpose(Image.FLIP_TOP_BOTTOM)
-        if(ll is None):
-            ll = lu.transpose(Image.FLIP_TOP_BOTTOM)
-
-        ret.paste(lu.resize((bs, bs), Image.LANCZOS), (0, 0))
-        ret.paste(up.resize((_, bs), Image.LANCZOS), (bs, 0))
-        ret.paste(ru.resize((bs, bs), Image.LANCZOS), (bs+_, 0))
-        # ret.show()
-
-        ret.paste(le.resize((bs, __), Image.LANCZOS), (0, bs))
-        ret.paste(mi.resize((_, __), Image.LANCZOS), (bs, bs))
-        ret.paste(ri.resize((bs, __), Image.LANCZOS), (bs+_, bs))
-        # ret.show()
-
-        ret.paste(ll.resize((bs, bs), Image.LANCZOS), (0, bs+__))
-        ret.paste(lo.resize((_, bs), Image.LANCZOS), (bs, bs+__))
-        ret.paste(rl.resize((bs, bs), Image.LANCZOS), (bs+_, bs+__))
-        # ret.show()
-
-        ret1.paste(img, (mid_border_size, mid_border_size))
-        # print(bs,mid_border_size)
-        # ret1.show()
-        return Image.alpha_composite(ret, ret1)
+        ret = skin.frame((_, __), border_size, get_quality(kwargs).resample)
+        ret.alpha_composite(img, (mid_border_size, mid_border_size))
+        return ret
 
 
 class gif(Widget):
+    # the frame at kwargs["frameTime"] seconds (see animation), the current time without it
+    kwargsKeys = ("frameTime", )
+
     def __init__(self, frames, fps):
         self.frames = frames
         self.fps = fps
@@ -862,11 +1346,17 @@ class gif(Widget):
     def render(self, **kwargs):
         frames = solveCallable(self.frames)
         le = len(frames)
-        idx = int(time.time()*self.fps) % le
-        return _render_content(frames[idx])
+        t = kwargs.get("frameTime")
+        if(t is None):
+            memo.taint()    # changes by itself
+            t = time.time()
+        idx = int(t*self.fps) % le
+        return _render_through(frames[idx])
 
 
 class ProgressBar(Widget):
+    kwargsKeys = ("progress", "bg", "fill", "quality")
+
     def __init__(self, width, bg=None, fill=None, height=None, progress=None, borderColor=None, resizeMethod=resize.cropWH, borderWidth=None):
         self.bg = bg
         self.fill = fill
@@ -905,9 +1395,10 @@ class ProgressBar(Widget):
                 kwa = {}
                 kwa.update({'progbar_width': pw, 'grad_width': pw})
                 kwa.update({'progbar_height': pw, 'grad_height': ph})
-                fill = fill.render(**kwargs)
+                fill = _render_content(fill, **kwargs)
             size = pw, ph
-            fill = self.resizeMethod(fill, size)
+            fill = self.resizeMethod(
+                fill, size, **_resize_kwargs(self.resizeMethod, get_quality(kwargs)))
             ret.paste(fill, box=(bw, bw), mask=fill)
         else:
             raise Exception("Unsupported progress bar fill %s" % fill)
@@ -917,6 +1408,7 @@ class ProgressBar(Widget):
 def fExtractKwa(key):
     def inner(key=key, **kwargs):
         return kwargs.get(key)
+    inner.kwargsKeys = (key, )
     return inner
 
 
@@ -0,0 +1,24 @@
+from glob import glob
+import os
+import pytest
+from pil_functional_layout import mylocale
+
+
+def _find_font():
+    candidates = [os.environ.get("PFL_TEST_FONT"), mylocale.get_default_font()]
+    for pattern in ("/usr/share/fonts/**/*.ttf", "/usr/local/share/fonts/**/*.ttf",
+                    "/Library/Fonts/*.ttf", "C:/Windows/Fonts/*.ttf"):
+        candidates.extend(sorted(glob(pattern, recursive=True)))
+    for i in candidates:
+        if(i and os.path.exists(i)):
+            return i
+    return None
+
+
+@pytest.fixture(scope="session")
+def font():
+    # a TrueType font for tests drawing text, set PFL_TEST_FONT where none is installed
+    ret = _find_font()
+    if(ret is None):
+        pytest.skip("no font found, set PFL_TEST_FONT")
+    return ret
@@ -0,0 +1,69 @@
+from io import BytesIO
+from PIL import Image, ImageSequence
+import pytest
+from pil_functional_layout import Column, ProgressBar, colorBox, reads, render_animation, save_animation
+
+N = 6
+
+
+class Static(colorBox):
+    renders = 0
+
+    def render(self, **kwargs):
+        Static.renders += 1
+        return super().render(**kwargs)
+
+
+@reads("frame")
+def progress(frame, **kwargs):
+    return frame/(N-1)
+
+
+def card():
+    return Column([Static((0, 128, 255, 255), 40, 10), ProgressBar(60, progress=progress)],
+                  bg=(255, 255, 255, 255), borderWidth=2)
+
+
+def test_frames_match_render():
+    widget = card()
+    Static.renders = 0
+    frames = render_animation(widget, 1, N)
+    assert len(frames) == N
+    # only the progress bar changes, the rest is rendered once
+    assert Static.renders == 1
+    for i, im in enumerate(frames):
+        assert im.tobytes() == widget.render(frame=i, frameTime=i/N).tobytes()
+    assert len(set(i.tobytes() for i in frames)) == N
+
+
+def decoded(data):
+    with Image.open(BytesIO(data)) as im:
+        return [(i.convert("RGBA"), i.info.get("duration")) for i in ImageSequence.Iterator(im)]
+
+
+@pytest.mark.parametrize("format", ["apng", "webp"])
+def test_lossless_round_trip(format):
+    frames = render_animation(card(), 1, N)
+    bio = BytesIO()
+    save_animation(frames, bio, 10, format=format)
+    got = decoded(bio.getvalue())
+    assert len(got) == N
+    for (im, duration), expected in zip(got, frames):
+        assert duration == 100
+        assert im.tobytes() == expected.tobytes()
+
+
+def test_gif_keeps_static_parts(tmp_path):
+    frames = render_animation(card(), 1, N)
+    pth = tmp_path/"card.gif"
+    save_animation(frames, pth, 10)
+    got = decoded(pth.read_bytes())
+    assert len(got) == N
+    # the static box comes out the same in every frame
+    boxes = set(im.crop((2, 2, 42, 12)).tobytes() for im, duration in got)
+    assert len(boxes) == 1
+
+
+def test_unsupported_format():
+    with pytest.raises(ValueError):
+        save_animation([Image.new("RGBA", (4, 4))], BytesIO(), 10, format="bmp")
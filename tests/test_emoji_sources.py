@@ -0,0 +1,132 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+import threading
+from time import perf_counter
+from PIL import Image
+import pytest
+from pil_functional_layout import EmojiStore, EmojiSource, DirectoryEmojiSource, HTTPEmojiSource
+from pil_functional_layout.get_emoji import EmojiFail
+
+
+def png(color):
+    bio = BytesIO()
+    Image.new("RGBA", (16, 16), color).save(bio, "PNG")
+    return bio.getvalue()
+
+
+RED = (255, 0, 0, 255)
+BLUE = (0, 0, 255, 255)
+
+
+@pytest.fixture
+def server():
+    # a stand-in for openmoji: /<CODE>.png for the codes it has, 404 for the rest
+    served = {"1F600": png(RED)}
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            code = self.path.strip("/").split(".")[0]
+            requests.append(code)
+            data = served.get(code)
+            if(data is None):
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:%d/%%s.png" % httpd.server_address[1], requests
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_source_is_abstract():
+    with pytest.raises(TypeError):
+        EmojiSource()
+
+
+def test_http_fallback(server, tmp_path):
+    url, requests = server
+    store = EmojiStore([HTTPEmojiSource(url, timeout=5)], cache_dir=tmp_path)
+    im = store.get("1f600", 32)
+    assert im.height == 32 and im.getpixel((0, 0)) == RED
+    # written to the cache dir, served from memory then from disk
+    assert (tmp_path/"1F600.png").exists()
+    assert store.get("1F600", 32) is im
+    store.clear()
+    store.get("1F600", 16)
+    assert requests == ["1F600"]
+
+
+def test_http_missing(server):
+    url, requests = server
+    store = EmojiStore([HTTPEmojiSource(url, timeout=5)])
+    with pytest.raises(EmojiFail):
+        store.get("1F601")
+    with pytest.raises(EmojiFail):
+        store.get("1F601")
+    assert requests == ["1F601"]
+
+
+def test_local_source_first(server, tmp_path):
+    url, requests = server
+    (tmp_path/"1F600.png").write_bytes(png(BLUE))
+    store = EmojiStore([DirectoryEmojiSource(tmp_path), HTTPEmojiSource(url, timeout=5)])
+    assert store.get("1F600").getpixel((0, 0)) == BLUE
+    assert requests == []
+
+
+def test_prefetch(server):
+    url, requests = server
+    store = EmojiStore([HTTPEmojiSource(url, timeout=5)])
+    store.prefetch(["1F600", "1F602"], 20)
+    assert sorted(requests) == ["1F600", "1F602"]
+    assert store.get("1F600", 20).height == 20
+    with pytest.raises(EmojiFail):
+        store.get("1F602", 20)
+    assert len(requests) == 2
+
+
+class Slow(EmojiSource):
+    # serves one emoji once released
+    def __init__(self):
+        self.release = threading.Event()
+
+    def get_bytes(self, code):
+        self.release.wait(10)
+        return png(RED)
+
+
+def test_late_emoji_not_cached_as_text(font):
+    from pil_functional_layout import RichText, RenderCache, Column
+    src = Slow()
+    store = EmojiStore([src], prefetch_timeout=0.05)
+    tree = Column([RichText(["a\U0001F600b"], width=200, font=font, fontSize=20)])
+    cache = RenderCache()
+    placeholder = cache.render(tree, emojiStore=store)
+    src.release.set()
+    store.get("1F600", 20)     # waits for the fetch to finish
+    expected = tree.render(emojiStore=store)
+    assert expected.tobytes() != placeholder.tobytes()
+    assert cache.render(tree, emojiStore=store).tobytes() == expected.tobytes()
+
+
+def test_prefetch_zero_timeout():
+    src = Slow()
+    store = EmojiStore([src], prefetch_timeout=5)
+    start = perf_counter()
+    store.prefetch(["1F600", "1F602"], 20, timeout=0)
+    assert perf_counter()-start < 1
+    executor = store._pool()
+    src.release.set()
+    assert store.get("1F600", 20).height == 20
+    store.prefetch(["1F603", "1F604"], 20)
+    assert store._pool() is executor
@@ -0,0 +1,67 @@
+from io import BytesIO
+from PIL import Image
+import pytest
+from pil_functional_layout import encode, encode_presets
+from pil_functional_layout.encoding import to_palette
+
+
+def stripes(colors, mode="RGBA", width=7):
+    im = Image.new(mode, (width, len(colors)*3))
+    for idx, c in enumerate(colors):
+        im.paste(c[:len(mode)], (0, idx*3, width, idx*3+3))
+    return im
+
+
+CASES = {
+    # one band tells the colors apart
+    "band": [(0, 10, 10, 255), (1, 10, 10, 128), (2, 20, 10, 0), (3, 20, 10, 255)],
+    # no band does alone, three of them do
+    "merged": [(0, 0, 0, 255), (0, 1, 0, 255), (1, 0, 0, 255), (1, 1, 0, 255), (1, 1, 1, 255)],
+    # differing only in alpha
+    "alpha": [(50, 50, 50, 0), (50, 50, 50, 100), (60, 50, 50, 100), (60, 50, 50, 255)],
+    "single": [(9, 8, 7, 6)],
+}
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_to_palette_round_trip(name):
+    im = stripes(CASES[name])
+    pal = to_palette(im)
+    assert pal.mode in ("P", "L")
+    assert pal.convert("RGBA").tobytes() == im.tobytes()
+
+
+def test_to_palette_rgb():
+    im = stripes([(10, 20, 30), (10, 20, 31), (200, 0, 0)], "RGB")
+    assert to_palette(im).convert("RGB").tobytes() == im.tobytes()
+
+
+def test_to_palette_too_many_colors():
+    im = Image.new("RGBA", (300, 1))
+    im.putdata([(i % 256, i//256, 0, 255) for i in range(300)])
+    assert to_palette(im) is None
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+@pytest.mark.parametrize("preset", ["png", "png-fast", "webp-lossless"])
+def test_lossless_presets_round_trip(name, preset):
+    im = stripes(CASES[name])
+    got = Image.open(BytesIO(encode(im, preset))).convert("RGBA")
+    if(preset == "webp-lossless"):
+        # webp doesn't keep the color of fully transparent pixels
+        got, im = [Image.composite(i, Image.new("RGBA", i.size), i.getchannel("A"))
+                   for i in (got, im)]
+    assert got.tobytes() == im.tobytes()
+
+
+def test_jpeg_flattened():
+    im = stripes([(0, 0, 0, 0), (0, 0, 0, 255)])
+    got = Image.open(BytesIO(encode(im, "jpeg")))
+    assert got.mode == "RGB"
+    assert min(got.getpixel((3, 1))) > 240 and max(got.getpixel((3, 4))) < 15
+
+
+def test_presets_decode():
+    im = stripes(CASES["merged"])
+    for name in encode_presets:
+        assert Image.open(BytesIO(encode(im, name))).size == im.size
@@ -0,0 +1,65 @@
+import pytest
+from pil_functional_layout import gradientBox
+
+RED = (255, 0, 0, 255)
+BLUE = (0, 0, 255, 255)
+SIZE = 64
+
+
+def close(a, b, tolerance=8):
+    return all(abs(i-j) <= tolerance for i, j in zip(a, b))
+
+
+def render(**corners):
+    return gradientBox(SIZE, SIZE, **corners).render()
+
+
+def test_vertical():
+    im = render(lu=RED, ll=BLUE)
+    assert im.size == (SIZE, SIZE)
+    assert im.getpixel((0, 0)) == RED
+    assert im.getpixel((SIZE-1, 0)) == RED
+    assert close(im.getpixel((0, SIZE-1)), BLUE)
+    assert im.getpixel((SIZE-1, SIZE-1)) == im.getpixel((0, SIZE-1))
+
+
+def test_horizontal():
+    # lu set and ru set, the case that used to come out wrong
+    im = render(lu=RED, ru=BLUE)
+    assert im.getpixel((0, 0)) == RED
+    assert im.getpixel((0, SIZE-1)) == RED
+    assert close(im.getpixel((SIZE-1, 0)), BLUE)
+    assert im.getpixel((SIZE-1, SIZE-1)) == im.getpixel((SIZE-1, 0))
+
+
+def test_diagonal_lu_rl():
+    im = render(lu=RED, rl=BLUE)
+    assert im.getpixel((0, 0)) == RED
+    assert close(im.getpixel((SIZE-1, SIZE-1)), BLUE)
+    assert close(im.getpixel((SIZE-1, 0)), im.getpixel((0, SIZE-1)), 1)
+    assert close(im.getpixel((SIZE-1, 0)), (128, 0, 128, 255))
+
+
+def test_diagonal_ll_ru():
+    im = render(ll=RED, ru=BLUE)
+    assert close(im.getpixel((0, SIZE-1)), RED)
+    assert close(im.getpixel((SIZE-1, 0)), BLUE)
+    assert close(im.getpixel((0, 0)), im.getpixel((SIZE-1, SIZE-1)), 1)
+    assert close(im.getpixel((0, 0)), (128, 0, 128, 255))
+
+
+def test_size_from_kwargs():
+    im = gradientBox(lu=RED, ll=BLUE).render(grad_width=20, grad_height=10)
+    assert im.size == (20, 10)
+
+
+@pytest.mark.parametrize("corners", [
+    dict(),
+    dict(lu=RED),
+    dict(lu=RED, rl=BLUE, ru=BLUE),
+    dict(ru=RED, rl=BLUE),
+    dict(lu=RED, ru=BLUE, ll=BLUE, rl=RED),
+])
+def test_unsupported_corners(corners):
+    with pytest.raises(Exception, match="Unsupported gradient"):
+        render(**corners)
@@ -0,0 +1,87 @@
+from PIL import Image
+import pytest
+from pil_functional_layout import Widget, Row, Column, Grid, AddBorder, SetKwargs, SetFont, SizeBox, gradientBox, RenderCache, reads
+
+
+def square(color, n=10):
+    return Image.new("RGBA", (n, n), color)
+
+
+RED = (255, 0, 0, 255)
+BLUE = (0, 0, 255, 128)
+
+
+@reads("n")
+def dynamic(n, **kwargs):
+    return square((0, n, 0, 255), n)
+
+
+TREES = [
+    Row([square(RED), square(BLUE, 16), dynamic], bg=(255, 255, 255, 255), borderWidth=3),
+    Column([square(RED, 20), Row([dynamic, square(BLUE)]), SizeBox(dynamic, stretchWH=(30, 12))],
+           alignX=0.5, borderWidth=2, borderColor=(0, 0, 0, 255)),
+    Grid([square(RED), square(BLUE, 14), dynamic, square(RED, 6)], borderWidth=2),
+    AddBorder(SetKwargs(Column([dynamic, square(RED)], stretchWidth=40), borderWidth=4),
+              borderWidth=5, borderColor=(9, 9, 9, 255)),
+    Row([gradientBox(20, 30, lu=RED, ll=BLUE), Column([dynamic])], alignY=1),
+]
+
+
+@pytest.mark.parametrize("tree", TREES)
+def test_plan_matches_render(tree):
+    plan = tree.compile()
+    for n in (8, 12):
+        expected = tree.render(n=n)
+        got = plan.render(n=n)
+        assert got.size == expected.size
+        assert got.tobytes() == expected.tobytes()
+
+
+@pytest.mark.parametrize("tree", TREES)
+def test_cached_plan_matches_render(tree):
+    plan = tree.compile(cache=RenderCache())
+    for n in (8, 12, 8):
+        assert plan.render(n=n).tobytes() == tree.render(n=n).tobytes()
+
+
+class Counted(Widget):
+    kwargsKeys = ()
+
+    def __init__(self):
+        self.renders = 0
+
+    def render(self, **kwargs):
+        self.renders += 1
+        return square(RED)
+
+
+def test_uncached_by_default():
+    leaf = Counted()
+    plan = Column([leaf, dynamic]).compile()
+    assert plan.cache is None
+    plan.render(n=4)
+    plan.render(n=5)
+    assert leaf.renders == 2
+
+
+def test_cache_reevaluates_dynamic_parts_only():
+    leaf = Counted()
+    tree = Column([leaf, dynamic])
+    plan = tree.compile(cache=RenderCache())
+    plan.render(n=4)
+    im = plan.render(n=5)
+    assert leaf.renders == 1
+    assert im.tobytes() == tree.render(n=5).tobytes()
+
+
+@pytest.mark.parametrize("wrap", [SetKwargs, SetFont])
+def test_content_image_is_not_returned(wrap):
+    for im in (square(RED), square(RED).convert("RGB")):
+        tree = wrap(SetKwargs(im))
+        renders = [tree.render(), tree.compile().render(), tree.compile(cache=RenderCache()).render()]
+        plan = tree.compile()
+        renders.append(plan.render())
+        renders.append(plan.render())
+        for got in renders:
+            assert got is not im and got.tobytes() == im.convert("RGBA").tobytes()
+        assert len(set(id(i) for i in renders)) == len(renders)
@@ -0,0 +1,59 @@
+from io import BytesIO
+from PIL import Image
+from pil_functional_layout import ProgressBar, RichText, EmojiStore, EmojiSource, quality_profiles
+from pil_functional_layout import resize
+
+
+def noise(size):
+    im = Image.effect_noise(size, 64).convert("RGBA")
+    im.putalpha(255)
+    return im
+
+
+FILL = noise((97, 31))
+
+
+def bar_fill(bar, kwargs):
+    # the fill as pasted by ProgressBar(bar, borderWidth=0, progress=1)
+    return bar.render(progress=1, **kwargs)
+
+
+def test_progress_bar_fill_follows_profile():
+    bar = ProgressBar(60, fill=FILL, borderWidth=0, height=12)
+    for name, profile in quality_profiles.items():
+        expected = resize.cropWH(FILL, (60, 12), **profile.resize_args())
+        assert bar_fill(bar, {"quality": name}).tobytes() == expected.tobytes()
+    assert bar_fill(bar, {}).tobytes() == bar_fill(bar, {"quality": "final"}).tobytes()
+    assert bar_fill(bar, {"quality": "draft"}).tobytes() != bar_fill(bar, {}).tobytes()
+
+
+def test_progress_bar_custom_resize():
+    # callables without resample arguments are called as before
+    bar = ProgressBar(60, fill=FILL, borderWidth=0, height=12,
+                      resizeMethod=lambda im, size: im.resize(size, Image.NEAREST))
+    assert bar_fill(bar, {"quality": "draft"}).tobytes() == FILL.resize((60, 12), Image.NEAREST).tobytes()
+
+
+class Noise(EmojiSource):
+    def get_bytes(self, code):
+        bio = BytesIO()
+        noise((72, 72)).save(bio, "PNG")
+        return bio.getvalue()
+
+
+def test_emoji_scaled_per_profile():
+    store = EmojiStore([Noise()])
+    final = store.get("1F600", 20)
+    draft = store.get("1F600", 20, quality=quality_profiles["draft"])
+    assert final.size == draft.size == (20, 20)
+    assert final.tobytes() != draft.tobytes()
+    assert store.get("1F600", 20, quality=quality_profiles["final"]) is final
+
+
+def test_rich_text_emoji_follows_profile(font):
+    store = EmojiStore([Noise()])
+    text = RichText(["\U0001F600"], width=100, font=font, fontSize=20)
+    draft = text.render(emojiStore=store, quality="draft")
+    final = text.render(emojiStore=store)
+    assert draft.tobytes() != final.tobytes()
+    assert len(store._images) == 2
@@ -0,0 +1,83 @@
+from PIL import Image
+from pil_functional_layout import Widget, Column, SetKwargs, AvatarCircle, Keyword, RenderCache, reads
+
+
+class Counted(Widget):
+    # a square of side n, counting its renders
+    kwargsKeys = ("n", )
+
+    def __init__(self):
+        self.renders = 0
+
+    def render(self, **kwargs):
+        self.renders += 1
+        n = kwargs["n"]
+        return Image.new("RGBA", (n, n), (n, 0, 0, 255))
+
+
+class Undeclared(Counted):
+    kwargsKeys = None
+
+
+def test_hit():
+    leaf = Counted()
+    tree = Column([leaf])
+    cache = RenderCache()
+    a = cache.render(tree, n=8)
+    b = cache.render(tree, n=8)
+    assert leaf.renders == 1
+    assert a.tobytes() == b.tobytes() == tree.render(n=8).tobytes()
+    assert cache.stats()["hits"] == 1
+
+
+def test_invalidated_by_declared_kwargs_only():
+    leaf = Counted()
+    tree = Column([leaf])
+    cache = RenderCache()
+    cache.render(tree, n=8, other=1)
+    cache.render(tree, n=8, other=2)
+    assert leaf.renders == 1
+    im = cache.render(tree, n=9)
+    assert leaf.renders == 2 and im.size == (9, 9)
+
+
+def test_undeclared_never_cached():
+    leaf = Undeclared()
+    tree = Column([leaf])
+    cache = RenderCache()
+    cache.render(tree, n=8)
+    cache.render(tree, n=8)
+    assert leaf.renders == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_eviction_keeps_budget_and_drops_key_sets():
+    cache = RenderCache(max_bytes=16*16*4*4)
+    # a new widget every render, as a callable building its subtree does
+    tree = Column([reads("n")(lambda n, **kwargs: Column([Counted()]))])
+    for i in range(200):
+        cache.render(tree, n=16, step=i)
+        tree = Column([reads("n")(lambda n, **kwargs: Column([Counted()]))])
+    stats = cache.stats()
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert len(cache._depsets) <= stats["entries"]
+
+
+def test_pinned_inputs_count_toward_budget():
+    cache = RenderCache(max_bytes=1 << 20)
+    tree = Column([AvatarCircle(Keyword("im"), size=32)])
+    for i in range(5):
+        cache.render(tree, im=Image.new("RGBA", (1000, 1000)))
+    # every entry would keep a 4MB image alive
+    assert cache.stats()["entries"] == 0
+    for i in range(5):
+        cache.render(tree, im=Image.new("RGBA", (100, 100)))
+    assert 0 < cache.stats()["bytes"] <= 1 << 20
+
+
+def test_result_is_not_shared():
+    tree = SetKwargs(Column([Counted()]))
+    cache = RenderCache()
+    a = cache.render(tree, n=8)
+    a.paste((0, 255, 0, 255), (0, 0, 8, 8))
+    assert cache.render(tree, n=8).getpixel((0, 0)) == (8, 0, 0, 255)
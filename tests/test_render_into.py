@@ -0,0 +1,41 @@
+import asyncio
+from io import BytesIO
+from PIL import Image
+from pil_functional_layout import Column, Keyword, AvatarCircle, reads
+
+
+@reads("size", "format", "offset")
+def box(size, format, offset, **kwargs):
+    # reads kwargs named like render_into's, render_bytes' and render_async's options
+    return Image.new("RGBA", (size, size//2), (offset, len(format), 200, 255))
+
+
+def card():
+    return Column([box, AvatarCircle(Keyword("xy"), 16)], bg=(255, 255, 255, 255))
+
+
+KWARGS = {"size": 24, "format": "abc", "offset": 90,
+          "xy": Image.new("RGBA", (20, 20), (10, 20, 30, 255))}
+
+
+def test_render_into_template_kwargs():
+    widget = card()
+    expected = widget.render(**KWARGS)
+    w, h = expected.size
+    buf = bytearray(w*h*4)
+    assert widget.render_into(buf, (w, h), kwargs=KWARGS) == (w, h)
+    assert bytes(buf) == expected.tobytes()
+
+
+def test_render_bytes_template_kwargs():
+    widget = card()
+    expected = widget.render(**KWARGS)
+    got = Image.open(BytesIO(widget.render_bytes("png", kwargs=KWARGS)))
+    assert got.convert("RGBA").tobytes() == expected.tobytes()
+
+
+def test_render_async_template_kwargs():
+    widget = card()
+    expected = widget.render(**KWARGS)
+    got = asyncio.run(widget.render_async(kwargs=KWARGS))
+    assert got.tobytes() == expected.tobytes()
@@ -0,0 +1,82 @@
+import multiprocessing
+from PIL import Image
+from pil_functional_layout import SharedImageCache, ImageCache
+
+ctx = multiprocessing.get_context("spawn")
+RED = (255, 0, 0, 255)
+
+
+def put_red(shared, key):
+    shared.put(key, Image.new("RGBA", (8, 8), RED))
+
+
+def hold(shared, key, held, done):
+    im = shared.get(key)
+    held.set()
+    done.wait(10)
+    del im
+
+
+def load_twice(shared, pth, queue):
+    cache = ImageCache(shared=shared)
+    cache.load(pth)
+    queue.put(shared.stats())
+
+
+def run(target, *args):
+    p = ctx.Process(target=target, args=args)
+    p.start()
+    p.join(30)
+    assert p.exitcode == 0
+
+
+def test_put_in_one_process_get_in_another(tmp_path):
+    shared = SharedImageCache(str(tmp_path), max_bytes=1 << 20)
+    assert shared.get("red") is None
+    run(put_red, shared, "red")
+    im = shared.get("red")
+    assert im.size == (8, 8) and im.getpixel((3, 3)) == RED
+    assert shared.stats()["hits"] == 1 and shared.stats()["entries"] == 1
+
+
+def test_drawing_leaves_the_entry_alone(tmp_path):
+    shared = SharedImageCache(str(tmp_path), max_bytes=1 << 20)
+    run(put_red, shared, "red")
+    im = shared.get("red")
+    im.paste((0, 0, 255, 255), (0, 0, 8, 8))
+    assert shared.get("red").getpixel((3, 3)) == RED
+
+
+def test_held_entries_are_not_evicted(tmp_path):
+    # room for one 8x8 entry, a second one needs the first gone
+    entry = 12+8*8*4
+    shared = SharedImageCache(str(tmp_path), max_bytes=entry+entry//2)
+    run(put_red, shared, "a")
+    held, done = ctx.Event(), ctx.Event()
+    p = ctx.Process(target=hold, args=(shared, "a", held, done))
+    p.start()
+    try:
+        assert held.wait(30)
+        blue = Image.new("RGBA", (8, 8), (0, 0, 255, 255))
+        assert shared.put("b", blue) is blue     # didn't fit
+        assert shared.get("a") is not None
+    finally:
+        done.set()
+        p.join(30)
+    assert p.exitcode == 0
+    # the holder is gone with its lock
+    assert shared.put("b", blue) is not blue
+    assert shared.get("a") is None
+    assert shared.get("b").getpixel((0, 0)) == (0, 0, 255, 255)
+
+
+def test_image_cache_decodes_once(tmp_path):
+    shared = SharedImageCache(str(tmp_path/"shm"), max_bytes=1 << 20)
+    pth = str(tmp_path/"red.png")
+    Image.new("RGBA", (8, 8), RED).save(pth)
+    queue = ctx.Queue()
+    run(load_twice, shared, pth, queue)
+    assert queue.get(timeout=5)["misses"] == 1
+    run(load_twice, shared, pth, queue)
+    stats = queue.get(timeout=5)
+    assert stats["hits"] == 1 and stats["misses"] == 0
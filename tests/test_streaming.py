@@ -0,0 +1,62 @@
+from io import BytesIO
+from PIL import Image
+import pytest
+from pil_functional_layout import Row, Column, Grid, colorBox, StreamLayout, PNGStreamWriter
+
+
+def row(i):
+    return Row([colorBox((i*37 % 256, 100, 50, 255), 12+i % 5),
+                colorBox((0, i*11 % 256, 200, 128), 20, 6+i % 7)], borderWidth=2, bg=(255, 255, 255, 255))
+
+
+def tall(n=40):
+    return Column([row(i) for i in range(n)]+[Column([row(i) for i in range(5)], alignX=1)],
+                  bg=(240, 240, 240, 255), borderWidth=3, alignX=0.5)
+
+
+def grid():
+    return Grid([row(i) for i in range(12)], borderWidth=2)
+
+
+@pytest.mark.parametrize("widget", [tall(), grid()])
+def test_bands_match_render(widget):
+    expected = widget.render()
+    layout = widget.stream()
+    assert layout.size == expected.size
+    got = Image.new("RGBA", layout.size)
+    for top, band in layout.bands(band_height=37):
+        assert band.width == expected.width
+        got.paste(band, (0, top))
+    assert got.tobytes() == expected.tobytes()
+
+
+@pytest.mark.parametrize("box", [(0, 0, 30, 30), (5, 100, 60, 180), (-10, -10, 20, 20), (20, 300, 400, 2000)])
+def test_region_matches_crop(box):
+    widget = tall()
+    layout = widget.stream()
+    assert layout.region(box).tobytes() == widget.render().crop(box).tobytes()
+    # scrolling reuses what the previous box overlapped
+    moved = (box[0], box[1]+7, box[2], box[3]+7)
+    assert layout.region(moved).tobytes() == widget.render().crop(moved).tobytes()
+    assert widget.render_region(box).tobytes() == widget.render().crop(box).tobytes()
+
+
+def test_save_png():
+    widget = tall()
+    bio = BytesIO()
+    widget.stream().save_png(bio, band_height=50)
+    bio.seek(0)
+    with Image.open(bio) as im:
+        assert im.convert("RGBA").tobytes() == widget.render().tobytes()
+
+
+def test_png_writer_checks_rows():
+    writer = PNGStreamWriter(BytesIO(), (4, 4))
+    writer.write(Image.new("RGBA", (4, 2)))
+    with pytest.raises(ValueError):
+        writer.close()
+
+
+def test_only_column_and_grid():
+    with pytest.raises(TypeError):
+        StreamLayout(row(0))